@@ -0,0 +1,87 @@
+from array import array
+from collections import OrderedDict
+
+CLASSES = ("compulsory", "capacity", "conflict")
+
+# log2 buckets of the reuse histogram; bucket b holds distances in
+# [2^(b-1), 2^b), bucket 0 immediate reuses
+REUSE_BUCKETS = 65
+
+# 3C classification of the misses of one Cache, observed by wrapping its
+# access method. Every access to the level also goes to a shadow fully
+# associative LRU cache of the same capacity, and the previous access of every
+# block seen is remembered. A miss is compulsory for a block never seen,
+# capacity if the shadow cache misses as well, and conflict otherwise.
+#
+# The reuse histogram counts, for every access to a block seen before, the
+# accesses to this level since its previous one (reuse time). Unlike the
+# stack distances of analysis/StackDistance.py this takes O(1) per access, so
+# the whole analysis costs a few dict operations per access and memory
+# proportional to the distinct blocks, and can stay on for full-size traces.
+class MissAnalysis(object):
+	def __init__(self, cache, level):
+		self.cache = cache
+		self.level = level
+		self.capacity = cache.num_sets * cache.associativity
+		self.shadow = OrderedDict()
+		self.last_access = {}
+		self.accesses = 0
+		self.misses = dict.fromkeys(CLASSES, 0)
+		self.set_misses = {name: array('Q', bytes(8 * cache.num_sets)) for name in CLASSES}
+		self.reuse = array('Q', bytes(8 * REUSE_BUCKETS))
+		cache.access = self.observe(cache.access)
+
+	def observe(self, access):
+		cache = self.cache
+		offset_bits = cache.offset_bits
+		index_mask = cache.index_mask
+		capacity = self.capacity
+		shadow = self.shadow
+		last_access = self.last_access
+		reuse = self.reuse
+		def observed_access(operation, address, *args):
+			misses = cache.read_misses + cache.write_misses
+			result = access(operation, address, *args)
+			missed = cache.read_misses + cache.write_misses != misses
+
+			block = address >> offset_bits
+			position = self.accesses
+			self.accesses = position + 1
+			previous = last_access.get(block)
+			last_access[block] = position
+			if previous is not None:
+				reuse[(position - previous - 1).bit_length()] += 1
+
+			shadow_hit = block in shadow
+			if shadow_hit:
+				shadow.move_to_end(block)
+			else:
+				shadow[block] = None
+				if len(shadow) > capacity:
+					shadow.popitem(last=False)
+
+			if missed:
+				if previous is None:
+					name = "compulsory"
+				elif not shadow_hit:
+					name = "capacity"
+				else:
+					name = "conflict"
+				self.misses[name] += 1
+				self.set_misses[name][block & index_mask] += 1
+			return result
+		return observed_access
+
+	def results(self):
+		last = max((bucket for bucket in range(REUSE_BUCKETS) if self.reuse[bucket]), default=-1)
+		return {
+			"level": self.level,
+			"accesses": self.accesses,
+			"misses": dict(self.misses),
+			"set_misses": {name: list(counts) for name, counts in self.set_misses.items()},
+			# [low, high) bounds of every bucket up to the last non-empty one
+			"reuse_histogram": [
+				{"min": 1 << bucket >> 1, "max": 1 << bucket, "count": self.reuse[bucket]}
+				for bucket in range(last + 1)
+			],
+		}
@@ -0,0 +1,130 @@
+import heapq
+import math
+from array import array
+from analysis.StackDistance import Fenwick
+from utils.Trace import read_trace
+
+# hashes are compared against a threshold out of MODULUS
+MODULUS = 1 << 24
+
+# spreads block numbers uniformly over [0, MODULUS) (Fibonacci hashing)
+def block_hash(block):
+	return (block * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> 40
+
+# SHARDS spatially hashed sampling for approximate fully associative LRU
+# miss-ratio curves. Only blocks whose hash falls below a threshold are
+# tracked; a block is either always or never sampled, so reuse distances
+# among sampled blocks, divided by the sampling rate, estimate the distances
+# in the full trace.
+#
+# With a fixed `rate` memory grows with the sampled distinct blocks. With
+# `max_samples`, at most that many blocks are tracked: whenever one more would
+# be needed, the threshold drops to evict the blocks with the largest hash
+# and the counts gathered so far are rescaled to the lower rate.
+#
+# Distances are counted with a Fenwick tree over the positions of sampled
+# accesses, renumbered whenever the tree fills up, so it only ever holds
+# about twice as many positions as there are tracked blocks.
+class Shards(object):
+	def __init__(self, block_size, max_size, rate=None, max_samples=None):
+		self.block_size = block_size
+		self.offset_bits = int(math.log2(block_size))
+		self.max_size = max_size
+		self.max_blocks = max_size // block_size
+		self.threshold = min(max(int(rate * MODULUS), 1), MODULUS) if rate else MODULUS
+		self.max_samples = max_samples
+		# histogram[d] is the weight of sampled reuses at scaled distance d,
+		# the last bucket every distance that misses in all cache sizes
+		self.histogram = array('d', bytes(array('d').itemsize * (self.max_blocks + 1)))
+		self.cold_misses = 0.0
+		self.samples = 0.0
+		self.total_accesses = 0
+		self.last_access = {}
+		# (-hash, block) of every tracked block, for fixed-size sampling
+		self.hashes = []
+		self.fenwick = Fenwick(1024)
+		self.position = 0
+
+	def read_trace_file(self, trace_file):
+		offset_bits = self.offset_bits
+		for operation, address in read_trace(trace_file):
+			self.access(address >> offset_bits)
+		return self
+
+	def access(self, block):
+		self.total_accesses += 1
+		block_hash_value = block_hash(block)
+		if block_hash_value >= self.threshold:
+			return
+
+		if self.position == self.fenwick.size:
+			self.compact()
+		fenwick = self.fenwick
+		position = self.position
+		previous = self.last_access.get(block)
+		if previous is None:
+			self.cold_misses += 1
+		else:
+			distance = fenwick.prefix(position) - fenwick.prefix(previous + 1)
+			scaled = distance * MODULUS // self.threshold
+			self.histogram[min(scaled, self.max_blocks)] += 1
+			fenwick.add(previous, -1)
+		fenwick.add(position, 1)
+		self.last_access[block] = position
+		self.position = position + 1
+		self.samples += 1
+
+		if previous is None and self.max_samples:
+			heapq.heappush(self.hashes, (-block_hash_value, block))
+			if len(self.last_access) > self.max_samples:
+				self.lower_threshold()
+
+	# renumbers the most recent accesses of tracked blocks from 0
+	def compact(self):
+		live = sorted(self.last_access.items(), key=lambda item: item[1])
+		self.fenwick = Fenwick(max(2 * len(live), 1024))
+		for position, (block, previous) in enumerate(live):
+			self.last_access[block] = position
+			self.fenwick.add(position, 1)
+		self.position = len(live)
+
+	# stops sampling the blocks with the largest hash
+	def lower_threshold(self):
+		threshold = -self.hashes[0][0]
+		while self.hashes and -self.hashes[0][0] >= threshold:
+			block_hash_value, block = heapq.heappop(self.hashes)
+			self.fenwick.add(self.last_access.pop(block), -1)
+
+		scale = threshold / self.threshold
+		self.threshold = threshold
+		for distance in range(len(self.histogram)):
+			self.histogram[distance] *= scale
+		self.cold_misses *= scale
+		self.samples *= scale
+
+	def rate(self):
+		return self.threshold / MODULUS
+
+	def accesses(self):
+		return self.total_accesses
+
+	# estimated miss ratio of a fully associative LRU cache of `size` bytes
+	def miss_ratio(self, size):
+		histogram = self.histogram
+		hits = sum(histogram[:size // self.block_size])
+		total = self.cold_misses + sum(histogram)
+		if self.max_samples is None:
+			# SHARDS_adj: the difference between the expected and the actual
+			# number of samples goes to the hits at distance 0
+			adjustment = self.total_accesses * self.rate() - self.samples
+			hits += adjustment
+			total += adjustment
+		return min(max(1 - hits / total, 0.0), 1.0) if total > 0 else 0.0
+
+	# (size, associativity, estimated misses) of fully associative caches of
+	# every power-of-two size between min_size and max_size
+	def miss_ratio_curve(self, min_size):
+		size = min_size
+		while size <= self.max_size:
+			yield size, size // self.block_size, round(self.miss_ratio(size) * self.total_accesses)
+			size <<= 1
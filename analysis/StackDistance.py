@@ -0,0 +1,138 @@
+import math
+from array import array
+from utils.Trace import read_trace
+
+# Fenwick (binary indexed) tree over trace positions; holds a 1 at the
+# position of the most recent access to every block seen so far
+class Fenwick(object):
+	def __init__(self, size):
+		self.size = size
+		self.tree = array('l', bytes(array('l').itemsize * (size + 1)))
+
+	def add(self, position, delta):
+		tree = self.tree
+		position += 1
+		while position <= self.size:
+			tree[position] += delta
+			position += position & -position
+
+	# sum of positions [0, position)
+	def prefix(self, position):
+		tree = self.tree
+		total = 0
+		while position > 0:
+			total += tree[position]
+			position -= position & -position
+		return total
+
+# Mattson stack-distance analysis for LRU caches with a fixed block size.
+# The trace is read once; for every number of sets a per-set stack-distance
+# histogram is built, from which the misses of every cache size and
+# associativity follow: an access misses in an A-way set iff at least A
+# distinct blocks of its set were touched since its previous access.
+class StackDistance(object):
+	# deepest stack still kept as a plain list
+	SHALLOW_STACK = 256
+
+	def __init__(self, block_size, max_size):
+		self.block_size = block_size
+		self.offset_bits = int(math.log2(block_size))
+		self.max_size = max_size
+		self.max_blocks = max_size // block_size
+		self.blocks = array('Q')
+		# histograms[num_sets][d] counts reuses at distance d, with the last
+		# bucket holding every distance that misses in all cache sizes
+		self.histograms = {}
+		# compulsory misses are the same for every configuration
+		self.cold_misses = 0
+
+	def read_trace_file(self, trace_file):
+		for operation, address in read_trace(trace_file):
+			self.blocks.append(address >> self.offset_bits)
+		return self
+
+	def analyze(self):
+		num_sets = 1
+		while num_sets <= self.max_blocks:
+			self.histograms[num_sets] = self.histogram(num_sets)
+			num_sets <<= 1
+		return self
+
+	def histogram(self, num_sets):
+		max_distance = self.max_blocks // num_sets
+		histogram = array('L', bytes(array('L').itemsize * (max_distance + 1)))
+		if max_distance <= self.SHALLOW_STACK:
+			self.cold_misses = self.truncated_stacks(num_sets, max_distance, histogram)
+		else:
+			self.cold_misses = self.reuse_intervals(num_sets, max_distance, histogram)
+		return histogram
+
+	# explicit per-set LRU stacks, cut off below the deepest position of interest
+	def truncated_stacks(self, num_sets, max_distance, histogram):
+		mask = num_sets - 1
+		stacks = [[] for _ in range(num_sets)]
+		seen = set()
+		cold_misses = 0
+		for block in self.blocks:
+			stack = stacks[block & mask]
+			try:
+				distance = stack.index(block)
+				del stack[distance]
+			except ValueError:
+				if block in seen:
+					distance = max_distance
+				else:
+					seen.add(block)
+					cold_misses += 1
+					distance = None
+			if distance is not None:
+				histogram[distance] += 1
+			stack.insert(0, block)
+			if len(stack) > max_distance:
+				stack.pop()
+		return cold_misses
+
+	# distinct blocks between two uses counted with a Fenwick tree,
+	# O(log n) per access regardless of the stack depth
+	def reuse_intervals(self, num_sets, max_distance, histogram):
+		blocks = self.blocks
+		mask = num_sets - 1
+
+		# lay the accesses out set by set, so the accesses between two uses of
+		# a block that fall in its set form one contiguous range
+		order = sorted(range(len(blocks)), key=lambda position: blocks[position] & mask)
+		fenwick = Fenwick(len(order))
+		last_access = {}
+		cold_misses = 0
+		for current, position in enumerate(order):
+			block = blocks[position]
+			previous = last_access.get(block)
+			if previous is None:
+				cold_misses += 1
+			else:
+				distance = fenwick.prefix(current) - fenwick.prefix(previous + 1)
+				histogram[min(distance, max_distance)] += 1
+				fenwick.add(previous, -1)
+			fenwick.add(current, 1)
+			last_access[block] = current
+
+		return cold_misses
+
+	def accesses(self):
+		return len(self.blocks)
+
+	def misses(self, size, associativity):
+		num_sets = size // (associativity * self.block_size)
+		histogram = self.histograms[num_sets]
+		return self.cold_misses + sum(histogram[associativity:])
+
+	# (size, associativity, misses) for every power-of-two configuration
+	# between min_size and max_size, from direct-mapped to fully associative
+	def miss_ratio_curve(self, min_size):
+		size = min_size
+		while size <= self.max_size:
+			associativity = 1
+			while associativity * self.block_size <= size:
+				yield size, associativity, self.misses(size, associativity)
+				associativity <<= 1
+			size <<= 1
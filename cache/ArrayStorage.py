@@ -0,0 +1,151 @@
+from array import array
+
+# Struct-of-arrays replacement for a list of lists of StorageBlock objects.
+# Block state lives in flat vectors indexed by `set * associativity + way`;
+# sets and blocks are handed out as lightweight views over those vectors so
+# Cache, the policies and the Debugger can use them like StorageBlocks.
+class ArrayStorage(object):
+	def __init__(self, num_sets, associativity, index_bits, offset_bits, debugger):
+		self.num_sets = num_sets
+		self.associativity = associativity
+		self.index_bits = index_bits
+		self.offset_bits = offset_bits
+		self.debugger = debugger
+
+		size = num_sets * associativity
+		self.tags = array('Q', bytes(8 * size))
+		self.valid = bytearray(size)
+		self.dirty = bytearray(size)
+		# policy state; one vector per metadata key, created on first use
+		self.metadata = {}
+
+	def __len__(self):
+		return self.num_sets
+
+	def __getitem__(self, index):
+		if index < 0 or index >= self.num_sets:
+			raise IndexError(index)
+		return ArraySet(self, index)
+
+	def __iter__(self):
+		for index in range(self.num_sets):
+			yield ArraySet(self, index)
+
+	def metadata_vector(self, key, value):
+		vector = self.metadata.get(key)
+		if vector is None:
+			typecode = 'd' if isinstance(value, float) else 'q'
+			vector = array(typecode, bytes(8 * len(self.valid)))
+			self.metadata[key] = vector
+		return vector
+
+class ArraySet(object):
+	__slots__ = ('storage', 'index')
+
+	def __init__(self, storage, index):
+		self.storage = storage
+		self.index = index
+
+	def __len__(self):
+		return self.storage.associativity
+
+	def __getitem__(self, way):
+		if way < 0 or way >= self.storage.associativity:
+			raise IndexError(way)
+		return ArrayBlock(self.storage, self.index * self.storage.associativity + way)
+
+	def __iter__(self):
+		start = self.index * self.storage.associativity
+		for slot in range(start, start + self.storage.associativity):
+			yield ArrayBlock(self.storage, slot)
+
+# mapping from policy metadata keys to a block's entries in the storage vectors
+class ArrayMetadata(object):
+	__slots__ = ('storage', 'slot')
+
+	def __init__(self, storage, slot):
+		self.storage = storage
+		self.slot = slot
+
+	def __getitem__(self, key):
+		return self.storage.metadata[key][self.slot]
+
+	def __setitem__(self, key, value):
+		self.storage.metadata_vector(key, value)[self.slot] = value
+
+	def __contains__(self, key):
+		return key in self.storage.metadata
+
+# view of a single way; mirrors the StorageBlock interface
+class ArrayBlock(object):
+	__slots__ = ('storage', 'slot')
+
+	def __init__(self, storage, slot):
+		self.storage = storage
+		self.slot = slot
+
+	def __eq__(self, other):
+		return isinstance(other, ArrayBlock) and self.storage is other.storage and self.slot == other.slot
+
+	def __hash__(self):
+		return hash((id(self.storage), self.slot))
+
+	@property
+	def index(self):
+		return self.slot // self.storage.associativity
+
+	@property
+	def way(self):
+		return self.slot % self.storage.associativity
+
+	@property
+	def tag(self):
+		return self.storage.tags[self.slot]
+
+	@tag.setter
+	def tag(self, tag):
+		self.storage.tags[self.slot] = tag
+
+	@property
+	def valid(self):
+		return bool(self.storage.valid[self.slot])
+
+	@valid.setter
+	def valid(self, valid):
+		self.storage.valid[self.slot] = valid
+
+	@property
+	def dirty(self):
+		return bool(self.storage.dirty[self.slot])
+
+	@dirty.setter
+	def dirty(self, dirty):
+		self.storage.dirty[self.slot] = dirty
+
+	# the full address is not kept; every consumer only needs the block address
+	@property
+	def block_address(self):
+		storage = self.storage
+		return ((self.tag << storage.index_bits) | self.index) << storage.offset_bits
+
+	address = block_address
+
+	@property
+	def metadata(self):
+		return ArrayMetadata(self.storage, self.slot)
+
+	def set_dirty(self):
+		self.dirty = True
+		self.storage.debugger.log("set dirty")
+		return self
+
+	def invalidate(self, writeDirectlyToMemory=False):
+		self.valid = False
+		self.storage.debugger.invalidated(self, writeDirectlyToMemory)
+		return self
+
+	def store(self, address, index, tag, block_address):
+		self.tag = tag
+		self.dirty = False
+		self.valid = True
+		return self
@@ -1,23 +1,45 @@
+import heapq
 import math
+from array import array
 from cache.StorageBlock import StorageBlock
+from cache.ArrayStorage import ArrayStorage
+
+# statistics every cache level counts
+COUNTERS = ("reads", "read_misses", "writes", "write_misses", "writebacks", "memory_accesses")
 
 class Cache:
-	def __init__(self, size, associativity, block_size, policy, inclusion_property, lower_cache=None, upper_cache=None, debugger=None):
+	def __init__(self, size, associativity, block_size, policy, inclusion_property, lower_cache=None, upper_cache=None, debugger=None, array_storage=False):
 		self.num_sets = size // (associativity * block_size)
-		# self.memory = [[] for _ in range(self.num_sets)]
-		self.memory = [[StorageBlock(debugger) for _ in range(associativity)]
-					   for _ in range(self.num_sets)]
 		self.index_bits = int(math.log2(self.num_sets))
+		self.index_mask = (1 << self.index_bits) - 1
 		self.offset_bits = int(math.log2(block_size))
+		# self.memory = [[] for _ in range(self.num_sets)]
+		self.array_storage = array_storage
+		if array_storage:
+			# flat vectors instead of one object per way
+			self.memory = ArrayStorage(self.num_sets, associativity, self.index_bits, self.offset_bits, debugger)
+		else:
+			self.memory = [[StorageBlock(debugger, way) for way in range(associativity)]
+						   for _ in range(self.num_sets)]
+
+		# way of every valid block, keyed by block number (tag and index bits);
+		# one flat dict stands in for a tag->way map per set
+		self.ways = {}
+		# ways of a set are first filled in order; next_fill[index] is the next
+		# untouched way and free_ways[index] a heap of ways invalidated since
+		self.next_fill = array('L', bytes(array('L').itemsize * self.num_sets))
+		self.free_ways = {}
 
 		self.size = size
 		self.associativity = associativity
 		self.block_size = block_size
 		self.policy = policy
+		policy.configure(self.num_sets, associativity)
 		self.inclusion_property = inclusion_property
 		self.debugger = debugger
 		if debugger:
 			debugger.offset_bits = self.offset_bits
+			debugger.cache = self
 
 		self.reads = 0
 		self.read_misses = 0
@@ -34,6 +56,13 @@ class Cache:
 		if self.upper_cache:
 			self.upper_cache.lower_cache = self
 
+		# without debug output, use variants of the hot path that make no
+		# debugger calls; --debug keeps the instrumented methods below
+		if not (debugger and debugger.enabled()):
+			self.access = self.access_fast
+			self.evict = self.evict_fast
+			self.invalidate = self.invalidate_fast
+
 	def calculate_index_tag(self, address):
 		# Remove offset bits
 		address = address >> self.offset_bits
@@ -62,32 +91,50 @@ class Cache:
 			self.writes += 1
 
 	def is_set_full(self, index):
-		return len(self.memory[index]) >= self.associativity
+		return index not in self.free_ways and self.next_fill[index] >= self.associativity
+
+	def block_number(self, index, tag):
+		return (tag << self.index_bits) | index
 
 	# search for a given tag at a particular index
 	# returns the block if found, None otherwise
 	def search(self, index, tag):
-		for block in self.memory[index]:
-			if block.tag == tag and block.valid:
-				return block
+		way = self.ways.get(self.block_number(index, tag))
+		if way is None:
+			return None
+		return self.memory[index][way]
+
+	# returns the lowest invalid way of memory[index], None if the set is full
+	def take_free_way(self, index):
+		free_ways = self.free_ways.get(index)
+		if free_ways:
+			way = heapq.heappop(free_ways)
+			if not free_ways:
+				del self.free_ways[index]
+			return way
+
+		way = self.next_fill[index]
+		if way < self.associativity:
+			self.next_fill[index] = way + 1
+			return way
 		return None
 
 	# adds `address` to cache
 	# evicts a block if necessary
 	# returns the block that was updated
 	def evict(self, index):
-		# check all blocks in memory[index]
-		# if any are invalid, replace
-		for block in self.memory[index]:
-			if not block.valid:
-				self.debugger.victim(None)
-				return block
+		# if any block in memory[index] is invalid, replace it
+		way = self.take_free_way(index)
+		if way is not None:
+			self.debugger.victim(None)
+			return self.memory[index][way]
 
 		# no invalid blocks; evict
 		block = self.policy.evict(self.memory[index])
 		self.debugger.victim(block)
 		self.flush(block)
 		block.valid = False
+		del self.ways[self.block_number(index, block.tag)]
 
 		# inclusive cache
 		if self.inclusion_property == 1:
@@ -104,6 +151,8 @@ class Cache:
 
 		writeDirectlyToMemory = block.dirty and self.inclusion_property == 1 and self.lower_cache is not None
 		block.invalidate(writeDirectlyToMemory)
+		del self.ways[self.block_number(index, tag)]
+		heapq.heappush(self.free_ways.setdefault(index, []), block.way)
 		self.policy.remove(block)
 		self.flush(block, writeDirectlyToMemory)
 		return block
@@ -115,15 +164,21 @@ class Cache:
 
 		# if lower cache exists, write to it unless writeDirectlyToMemory flag is set
 		if self.lower_cache and not writeDirectlyToMemory:
-			self.lower_cache.access('w', block.address)
+			lower_block = self.lower_cache.access('w', block.address)
+			self.policy.writeback(block, lower_block)
 		else:
 			self.increment_counters(memory_access=True)
 
 		block.dirty = False
 		return block
 
-	def access(self, operation, address):
-		index, tag = self.calculate_index_tag(address)
+	# the block number (address >> offset bits, the same at every level) may
+	# be passed in when the trace was decoded ahead of time, see utils/Decoder.py
+	def access(self, operation, address, block_number=None):
+		if block_number is None:
+			index, tag = self.calculate_index_tag(address)
+		else:
+			index, tag = block_number & self.index_mask, block_number >> self.index_bits
 		block_address = address >> self.offset_bits  << self.offset_bits
 		self.debugger.operation(operation, block_address, tag, index)
 		self.increment_counters(operation=operation)
@@ -146,7 +201,7 @@ class Cache:
 
 			# if lower cache exists, copy from it
 			if self.lower_cache:
-				self.lower_cache.access('r', address)
+				self.lower_cache.access('r', address, block_number)
 			# otherwise read the block from memory
 			else:
 				# block read from memory, so increment memory accesses
@@ -154,6 +209,7 @@ class Cache:
 
 			# block loaded; now add it to cache
 			block.store(address, index, tag, block_address)
+			self.ways[self.block_number(index, tag)] = block.way
 			self.policy.insert(block)
 			self.debugger.policyUpdate()
 
@@ -163,6 +219,71 @@ class Cache:
 
 		return block
 
+	# access() without debug output; chosen in __init__ when debugging is off
+	def access_fast(self, operation, address, block_number=None):
+		if block_number is None:
+			block_number = address >> self.offset_bits
+		index = block_number & self.index_mask
+		tag = block_number >> self.index_bits
+
+		if operation == 'r':
+			self.reads += 1
+		elif operation == 'w':
+			self.writes += 1
+
+		way = self.ways.get(block_number)
+		if way is not None:
+			block = self.memory[index][way]
+			self.policy.update(block)
+
+		else:
+			self.increment_miss_counter(operation)
+			block = self.evict(index)
+
+			if self.lower_cache:
+				self.lower_cache.access('r', address, block_number)
+			else:
+				self.memory_accesses += 1
+
+			block.store(address, index, tag, block_number << self.offset_bits)
+			self.ways[block_number] = block.way
+			self.policy.insert(block)
+
+		if operation == 'w':
+			block.dirty = True
+
+		return block
+
+	# evict() without debug output
+	def evict_fast(self, index):
+		way = self.take_free_way(index)
+		if way is not None:
+			return self.memory[index][way]
+
+		block = self.policy.evict(self.memory[index])
+		self.flush(block)
+		block.valid = False
+		del self.ways[self.block_number(index, block.tag)]
+
+		if self.inclusion_property == 1 and self.upper_cache:
+			self.upper_cache.invalidate(block.address)
+
+		return block
+
+	# invalidate() without debug output
+	def invalidate_fast(self, address):
+		block_number = address >> self.offset_bits
+		way = self.ways.pop(block_number, None)
+		if way is None: return
+		index = block_number & self.index_mask
+		block = self.memory[index][way]
+
+		block.valid = False
+		heapq.heappush(self.free_ways.setdefault(index, []), way)
+		self.policy.remove(block)
+		self.flush(block, block.dirty and self.inclusion_property == 1 and self.lower_cache is not None)
+		return block
+
 	def get_contents(self):
 		contents = ""
 		for i, memory_set in enumerate(self.memory):
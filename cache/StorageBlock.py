@@ -1,5 +1,6 @@
 class StorageBlock(object):
-	def __init__(self, debugger):
+	def __init__(self, debugger, way=0):
+		self.way = way
 		self.address = None
 		self.index = None
 		self.tag = 0
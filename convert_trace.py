@@ -0,0 +1,14 @@
+import argparse
+from utils.Trace import convert_trace
+
+def main():
+	parser = argparse.ArgumentParser(description="Convert a text trace to the packed binary trace format")
+	parser.add_argument("trace_file", type=str, help="Text trace file (`r|w <hex address>` per line); `-` for stdin, .gz/.xz/.bz2 are decompressed")
+	parser.add_argument("output_file", type=str, help="Binary trace file to write")
+
+	args = parser.parse_args()
+	count = convert_trace(args.trace_file, args.output_file)
+	print(f"{args.trace_file}: {count} accesses written to {args.output_file}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,30 @@
+import argparse
+from utils.Generator import PATTERNS, generate, write_chunks
+
+def main():
+	parser = argparse.ArgumentParser(description="Generate a deterministic synthetic trace")
+	parser.add_argument("pattern", type=str, choices=PATTERNS, help="Access pattern")
+	parser.add_argument("count", type=int, help="Number of accesses")
+	parser.add_argument("output_file", type=str, help="Trace file to write; `-` for stdout, .gz/.xz/.bz2 are compressed")
+	parser.add_argument("--binary", action=argparse.BooleanOptionalAction, help="Write the packed binary trace format instead of text (default: False)")
+	parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+	parser.add_argument("--footprint", type=int, default=1 << 24, help="Bytes of memory the accesses cover (default: 16 MiB)")
+	parser.add_argument("--stride", type=int, default=64, help="Bytes between strided accesses; granule of the random, zipf and pointer-chase patterns (default: 64)")
+	parser.add_argument("--write-ratio", type=float, default=0.3, help="Fraction of accesses that are writes (default: 0.3)")
+	parser.add_argument("--zipf-s", type=float, default=1.0, help="Zipf exponent of the zipf pattern (default: 1.0)")
+	parser.add_argument("--base", type=lambda value: int(value, 0), default=0, help="Address of the first byte of the footprint (default: 0)")
+
+	args = parser.parse_args()
+
+	if args.count < 0 or args.stride <= 0 or args.footprint < args.stride:
+		print("COUNT >= 0 and 0 < STRIDE <= FOOTPRINT must hold")
+		exit(1)
+	if not 0 <= args.write_ratio <= 1:
+		print("WRITE_RATIO must be between 0 and 1")
+		exit(1)
+
+	chunks = generate(args.pattern, args.count, seed=args.seed, footprint=args.footprint, stride=args.stride, write_ratio=args.write_ratio, zipf_s=args.zipf_s, base=args.base)
+	write_chunks(chunks, args.count, args.output_file, binary=args.binary)
+
+if __name__ == "__main__":
+	main()
@@ -1,7 +1,31 @@
+from array import array
+
 class Policy:
+	# whether a set's victims depend on nothing but its own accesses, so
+	# disjoint ranges of sets can be simulated separately (--jobs)
+	set_local = True
+
 	def __init__(self, counter):
 		self.counter = counter
 
+	# fresh instance for another cache in the hierarchy;
+	# policies may keep per-set state, so caches must not share one
+	def copy(self):
+		return type(self)(self.counter)
+
+	# called by the cache that owns the policy, before any other method;
+	# policies with fixed-size per-set state allocate it here
+	def configure(self, num_sets, associativity):
+		pass
+
+	# state kept outside the blocks' metadata, as named arrays, for
+	# checkpoints (see utils/Checkpoint.py); `restore` takes it back
+	def state(self):
+		return {}
+
+	def restore(self, state):
+		pass
+
 	# add necessary metadata to the block
 	def insert(self, block):
 		raise NotImplementedError("Not implemented!")
@@ -14,7 +38,22 @@ class Policy:
 	def remove(self, block):
 		raise NotImplementedError("Not implemented!")
 
+	# carry metadata over to the lower cache's copy of a written back block
+	def writeback(self, block, lower_block):
+		pass
+
 	# use metadata to select a block for eviction
 	# this should only be called if all blocks in the set are valid
 	def evict(self, cache_set):
 		raise NotImplementedError("Not implemented!")
+
+# per-set state packed into one int per set, as `width` bits of each set
+# concatenated into a byte array (for Policy.state), and back
+def pack_sets(values, width):
+	length = (width + 7) // 8 or 1
+	return array('B', b"".join(value.to_bytes(length, "little") for value in values))
+
+def unpack_sets(packed, width):
+	length = (width + 7) // 8 or 1
+	data = packed.tobytes()
+	return [int.from_bytes(data[start:start + length], "little") for start in range(0, len(data), length)]
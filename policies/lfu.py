@@ -1,31 +1,117 @@
-import math
-import time
+from array import array
+from collections import defaultdict
 
 from policies.Policy import Policy
 
+# Access counts of the valid ways of one set, bucketed by count: buckets[c]
+# is the bitmask of the ways accessed c times. min_count never exceeds the
+# lowest count present; it only falls behind after `discard`.
+class FrequencySet(object):
+	__slots__ = ('counts', 'buckets', 'min_count', 'accesses')
+
+	def __init__(self):
+		self.counts = {}
+		self.buckets = {}
+		self.min_count = 0
+		self.accesses = 0
+
+	def add(self, way, count):
+		self.counts[way] = count
+		self.buckets[count] = self.buckets.get(count, 0) | 1 << way
+		if count < self.min_count:
+			self.min_count = count
+
+	# removes `way` and returns its count, None if it was not present
+	def discard(self, way):
+		count = self.counts.pop(way, None)
+		if count is None:
+			return None
+		mask = self.buckets[count] & ~(1 << way)
+		if mask:
+			self.buckets[count] = mask
+		else:
+			del self.buckets[count]
+		return count
+
+	# lowest way among the least frequently used ones
+	def victim(self):
+		if self.min_count not in self.buckets:
+			self.min_count = min(self.buckets)
+		mask = self.buckets[self.min_count]
+		return (mask & -mask).bit_length() - 1
+
+	# halves every count
+	def decay(self):
+		buckets = {}
+		for count, mask in self.buckets.items():
+			buckets[count >> 1] = buckets.get(count >> 1, 0) | mask
+		self.buckets = buckets
+		self.counts = {way: count >> 1 for way, count in self.counts.items()}
+		self.min_count >>= 1
+
+# Least frequently used, ties broken by the lowest way. Counts live in
+# per-set frequency buckets, so hits and evictions take constant time at any
+# associativity. With a decay_period, the counts of a set are halved after
+# every decay_period accesses to it, so formerly hot blocks age out; this
+# costs O(associativity) once per period.
 class LFU(Policy):
-	def __init__(self, counter):
+	def __init__(self, counter, decay_period=0):
 		super().__init__(counter)
+		self.decay_period = decay_period
+		self.sets = defaultdict(FrequencySet)
+
+	def copy(self):
+		return type(self)(self.counter, self.decay_period)
 
-	# add required metadata to the block
+	# start counting at 0; an evicted block still occupies its way here
 	def insert(self, block):
-		block.metadata['accessed'] = 0
+		frequencies = self.sets[block.index]
+		frequencies.discard(block.way)
+		frequencies.add(block.way, 0)
+		self.accessed(frequencies)
 
-	# update last_access
+	# count one more access
 	def update(self, block):
-		block.metadata['accessed'] += 1
+		frequencies = self.sets[block.index]
+		count = frequencies.discard(block.way)
+		if count == frequencies.min_count and count not in frequencies.buckets:
+			frequencies.min_count = count + 1
+		frequencies.add(block.way, count + 1)
+		self.accessed(frequencies)
 
 	def remove(self, block):
-		pass
+		self.sets[block.index].discard(block.way)
 
-	# evict the block with the lowest accessed
+	def accessed(self, frequencies):
+		if self.decay_period:
+			frequencies.accesses += 1
+			if frequencies.accesses == self.decay_period:
+				frequencies.accesses = 0
+				frequencies.decay()
+
+	# evict the block with the lowest count
 	def evict(self, cache_set):
-		min_accessed = math.inf
-		evicted_block = None
-		for block in cache_set:
-			accessed = block.metadata['accessed']
-			if accessed < min_accessed:
-				min_accessed = accessed
-				evicted_block = block
-		return evicted_block
+		return cache_set[self.sets[cache_set[0].index].victim()]
+
+	# (set, way, count) of every counted way and (set, accesses since decay)
+	def state(self):
+		counts = array('q')
+		accesses = array('q')
+		for index, frequencies in self.sets.items():
+			for way, count in frequencies.counts.items():
+				counts.extend((index, way, count))
+			accesses.extend((index, frequencies.accesses))
+		return {"counts": counts, "accesses": accesses}
 
+	def restore(self, state):
+		self.sets.clear()
+		counts = state.get("counts", ())
+		for position in range(0, len(counts), 3):
+			index, way, count = counts[position:position + 3]
+			self.sets[index].add(way, count)
+		accesses = state.get("accesses", ())
+		for position in range(0, len(accesses), 2):
+			self.sets[accesses[position]].accesses = accesses[position + 1]
+		for frequencies in self.sets.values():
+			if frequencies.buckets:
+				frequencies.min_count = min(frequencies.buckets)
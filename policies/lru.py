@@ -1,30 +1,47 @@
-import math
-import time
+from array import array
+from collections import OrderedDict, defaultdict
 
 from policies.Policy import Policy
 
 class LRU(Policy):
 	def __init__(self, counter):
 		super().__init__(counter)
+		# per-set recency order of ways, least recently used first
+		self.stacks = defaultdict(OrderedDict)
 
-	# add required metadata to the block
+	# every non-empty stack as its set index, length and ways, bottom first
+	def state(self):
+		stacks = array('q')
+		for index, stack in self.stacks.items():
+			if stack:
+				stacks.append(index)
+				stacks.append(len(stack))
+				stacks.extend(stack)
+		return {"stacks": stacks}
+
+	def restore(self, state):
+		self.stacks.clear()
+		stacks = state.get("stacks", ())
+		position = 0
+		while position < len(stacks):
+			index, length = stacks[position], stacks[position + 1]
+			self.stacks[index] = OrderedDict.fromkeys(stacks[position + 2:position + 2 + length])
+			position += 2 + length
+
+	# push the block on top of its set's stack
 	def insert(self, block):
-		block.metadata['last_access'] = time.time()
+		stack = self.stacks[block.index]
+		stack[block.way] = None
+		stack.move_to_end(block.way)
 
-	# update last_access
+	# move the block back on top of the stack
 	def update(self, block):
-		block.metadata['last_access'] = time.time()
+		self.stacks[block.index].move_to_end(block.way)
 
 	def remove(self, block):
-		pass
+		self.stacks[block.index].pop(block.way, None)
 
-	# evict the block with the lowest last_access
+	# evict the block at the bottom of the stack
 	def evict(self, cache_set):
-		min_last_access = math.inf
-		evicted_block = None
-		for block in cache_set:
-			last_access = block.metadata['last_access']
-			if last_access < min_last_access:
-				min_last_access = last_access
-				evicted_block = block
-		return evicted_block
+		stack = self.stacks[cache_set[0].index]
+		return cache_set[next(iter(stack))]
@@ -1,63 +1,97 @@
+import copy
 import math
-from collections import defaultdict
+from array import array
 from policies.Policy import Policy
+from utils.NextUse import open_next_use
+from utils.Trace import LoadedTrace, read_trace
 
 class Optimal(Policy):
-	def __init__(self, counter, trace_file, block_size, debugger=None):
+	# with out_of_core, next uses are read from a memory-mapped sidecar file
+	# next to the trace instead of being computed in memory; `next_use` reuses
+	# the array of an earlier instance for the same trace and block size
+	def __init__(self, counter, trace_file, block_size, debugger=None, out_of_core=False, next_use=None):
 		super().__init__(counter)
 		self.debugger = debugger
-		offset_bits = int(math.log2(block_size))
-		self.future = self.read_trace_file(trace_file, offset_bits)
+		self.window = None
+		if next_use is not None:
+			self.next_use = next_use
+		elif out_of_core:
+			if isinstance(trace_file, LoadedTrace):
+				trace_file = trace_file.trace_file
+			self.window = open_next_use(trace_file, block_size)
+			self.next_use = self.window.values
+		else:
+			offset_bits = int(math.log2(block_size))
+			self.next_use = self.read_trace_file(trace_file, offset_bits)
+		# sentinel for blocks that are never accessed again
+		self.never = len(self.next_use)
 
+	# returns an array where next_use[i] is the position of the next access
+	# to the block accessed at position i (or len(next_use) if there is none)
 	def read_trace_file(self, trace_file, offset_bits):
-		future = defaultdict(list)
+		block_addresses = array('Q')
+		for operation, address in read_trace(trace_file):
+			block_addresses.append(address >> offset_bits)
 
-		with open(trace_file, "r") as file:
-			for line_number, line in enumerate(file):
-				if len(line.strip()) == 0:
-					continue
-				operation, address = line.strip().split(" ")
-				address = int(address, 16) >> offset_bits << offset_bits
-				future[address].append(line_number)
+		# single backward pass; `last_seen` maps a block to its closest later access
+		never = len(block_addresses)
+		next_use = array('q', bytes(8 * never))
+		last_seen = {}
+		for position in range(never - 1, -1, -1):
+			block_address = block_addresses[position]
+			next_use[position] = last_seen.get(block_address, never)
+			last_seen[block_address] = position
 
-		return future
+		return next_use
 
+	# position of the access currently being simulated
+	def position(self):
+		return self.counter.get() - 1
+
+	# follow the next-use chain of a block until it points past the current access
+	def refresh(self, block):
+		current = self.position()
+		next_use = block.metadata['next_use']
+		while next_use <= current:
+			next_use = self.next_use[next_use]
+		block.metadata['next_use'] = next_use
+		return next_use
+
+	# all state is per block, so copies can share the next-use array
+	def copy(self):
+		return copy.copy(self)
+
+	# the inserted block is always the one accessed at the current position;
+	# blocks written back from an upper cache are fixed up in `writeback`
 	def insert(self, block):
-		pass
+		position = self.position()
+		block.metadata['next_use'] = self.next_use[position]
+		if self.window:
+			self.window.slide(position)
 
 	def update(self, block):
-		current_counter = self.counter.get()
-		future = self.future[block.block_address]
-		while future and future[0] < current_counter:
-			future.pop(0)
+		self.refresh(block)
 
 	def remove(self, block):
 		pass
 
+	def writeback(self, block, lower_block):
+		lower_block.metadata['next_use'] = self.refresh(block)
+
 	def evict(self, cache_set):
-		max_distance = -1
+		max_next_use = -1
 		evicted_block = None
-		current_counter = self.counter.get()
 
 		for block in cache_set:
-			self.update(block)
-			future = self.future[block.block_address]
-
-			# # print the first 10 elements of future # TODO: remove
-			# if len(future) > 10:
-			# 	self.log(
-			# 		f"Address: {block.block_address:x}, Future: {future[:10]}")
-			# else:
-			# 	self.log(f"Address: {block.block_address:x}, Future: {future}")
+			next_use = self.refresh(block)
 
 			# if a block is never needed again, evict it
-			if not future:
+			if next_use == self.never:
 				return block
 
 			# find the farthest future access
-			distance = future[0] - current_counter
-			if distance > max_distance:
-				max_distance = distance
+			if next_use > max_next_use:
+				max_next_use = next_use
 				evicted_block = block
 
 		return evicted_block
@@ -0,0 +1,65 @@
+from policies.Policy import Policy, pack_sets, unpack_sets
+
+# Tree pseudo-LRU: a binary tree over the ways with one bit per inner node,
+# pointing to the half that holds the next victim. An access flips the bits
+# on the way's path to point away from it; eviction follows the bits from
+# the root. The bits of a set are packed into one int, the node splitting
+# ways [a, a + 2h) at a + h being bit a + h - 1, so every node gets a
+# distinct bit below the associativity rounded up to a power of two. With
+# an associativity that is not a power of two, eviction never descends
+# into the missing ways.
+class PLRU(Policy):
+	def __init__(self, counter):
+		super().__init__(counter)
+		self.trees = []
+
+	def configure(self, num_sets, associativity):
+		self.associativity = associativity
+		self.leaves = 1 << (associativity - 1).bit_length()
+		self.trees = [0] * num_sets
+		# per way: the bits of its path, and which of them point right,
+		# i.e. away from the way
+		self.path_masks = []
+		self.path_bits = []
+		for way in range(associativity):
+			mask = bits = 0
+			half = self.leaves >> 1
+			while half:
+				node = (way & -(half << 1)) + half
+				mask |= 1 << (node - 1)
+				if way < node:
+					bits |= 1 << (node - 1)
+				half >>= 1
+			self.path_masks.append(~mask)
+			self.path_bits.append(bits)
+
+	def state(self):
+		return {"trees": pack_sets(self.trees, self.leaves - 1)}
+
+	def restore(self, state):
+		if "trees" in state:
+			self.trees = unpack_sets(state["trees"], self.leaves - 1)
+
+	# point the path away from the block
+	def insert(self, block):
+		way = block.way
+		trees = self.trees
+		trees[block.index] = trees[block.index] & self.path_masks[way] | self.path_bits[way]
+
+	update = insert
+
+	# invalid ways are refilled before the tree is consulted again
+	def remove(self, block):
+		pass
+
+	# follow the bits from the root
+	def evict(self, cache_set):
+		tree = self.trees[cache_set[0].index]
+		way = 0
+		half = self.leaves >> 1
+		while half:
+			node = way + half
+			if tree >> (node - 1) & 1 and node < self.associativity:
+				way = node
+			half >>= 1
+		return cache_set[way]
@@ -0,0 +1,137 @@
+from array import array
+
+from policies.Policy import Policy, pack_sets, unpack_sets
+
+# re-reference prediction values are 2 bits: 0 is near-immediate, 3 distant
+RRPV_BITS = 2
+DISTANT = (1 << RRPV_BITS) - 1
+LONG = DISTANT - 1
+# BRRIP inserts one block in this many at LONG instead of DISTANT
+BIMODAL_THROTTLE = 32
+
+# Static re-reference interval prediction (Jaleel et al., ISCA 2010).
+# Blocks are inserted with a long predicted re-reference interval and
+# promoted to near-immediate on a hit; the victim is the lowest way
+# predicted distant, after aging the whole set until one is. The values of
+# a set are packed into one int, RRPV_BITS per way, so promotion, the
+# victim search and aging are a few bit operations on it.
+class SRRIP(Policy):
+	def __init__(self, counter):
+		super().__init__(counter)
+		self.sets = []
+
+	def configure(self, num_sets, associativity):
+		self.associativity = associativity
+		# lowest bit of every way's field
+		self.low = sum(1 << RRPV_BITS * way for way in range(associativity))
+		self.sets = [DISTANT * self.low] * num_sets
+
+	def state(self):
+		return {"sets": pack_sets(self.sets, RRPV_BITS * self.associativity)}
+
+	def restore(self, state):
+		if "sets" in state:
+			self.sets = unpack_sets(state["sets"], RRPV_BITS * self.associativity)
+
+	# value a block missing in set `index` is inserted with
+	def insertion(self, index):
+		return LONG
+
+	def insert(self, block):
+		index = block.index
+		shift = RRPV_BITS * block.way
+		self.sets[index] = self.sets[index] & ~(DISTANT << shift) | self.insertion(index) << shift
+
+	# hit priority: promote to near-immediate
+	def update(self, block):
+		self.sets[block.index] &= ~(DISTANT << RRPV_BITS * block.way)
+
+	def remove(self, block):
+		self.sets[block.index] |= DISTANT << RRPV_BITS * block.way
+
+	def evict(self, cache_set):
+		index = cache_set[0].index
+		values = self.sets[index]
+		low = self.low
+		high = values >> 1 & low
+		distant = high & values
+		if not distant:
+			# age every way by the distance of the oldest one from DISTANT;
+			# no field can carry into the next
+			values += (1 if high else 2 if values else 3) * low
+			self.sets[index] = values
+			distant = values >> 1 & values & low
+		return cache_set[(distant & -distant).bit_length() // RRPV_BITS]
+
+# Bimodal RRIP: inserts at DISTANT, and only one block in BIMODAL_THROTTLE
+# at LONG, so a working set larger than the cache keeps part of itself.
+# The choice is a deterministic insertion count rather than a random draw.
+class BRRIP(SRRIP):
+	# the insertion count is shared by all sets
+	set_local = False
+
+	def __init__(self, counter):
+		super().__init__(counter)
+		self.inserted = 0
+
+	def state(self):
+		state = super().state()
+		state["inserted"] = array('q', [self.inserted])
+		return state
+
+	def restore(self, state):
+		super().restore(state)
+		if "inserted" in state:
+			self.inserted = state["inserted"][0]
+
+	def insertion(self, index):
+		return self.bimodal()
+
+	def bimodal(self):
+		self.inserted += 1
+		if self.inserted == BIMODAL_THROTTLE:
+			self.inserted = 0
+			return LONG
+		return DISTANT
+
+# policy selection counter width and the leader sets of each policy
+PSEL_BITS = 10
+LEADER_SETS = 32
+
+# Dynamic RRIP: set dueling between SRRIP and BRRIP. A few leader sets
+# always use one of them; misses in SRRIP leaders count a saturating PSEL
+# counter up and misses in BRRIP leaders count it down, and the other sets
+# follow BRRIP while its top bit is set, i.e. while SRRIP misses more.
+class DRRIP(BRRIP):
+	def configure(self, num_sets, associativity):
+		super().configure(num_sets, associativity)
+		# just below the midpoint, so followers start with SRRIP
+		self.psel = (1 << (PSEL_BITS - 1)) - 1
+		# every stride-th set leads for SRRIP and the one halfway between for
+		# BRRIP, leaving at least half the sets as followers; caches with
+		# fewer than 4 sets have no leaders and stay with SRRIP
+		leaders = min(LEADER_SETS, num_sets // 4)
+		self.stride = num_sets // leaders if leaders else 0
+
+	def state(self):
+		state = super().state()
+		state["psel"] = array('q', [self.psel])
+		return state
+
+	def restore(self, state):
+		super().restore(state)
+		if "psel" in state:
+			self.psel = state["psel"][0]
+
+	def insertion(self, index):
+		if self.stride:
+			offset = index % self.stride
+			if offset == 0:
+				self.psel = min(self.psel + 1, (1 << PSEL_BITS) - 1)
+				return LONG
+			if offset == self.stride >> 1:
+				self.psel = max(self.psel - 1, 0)
+				return self.bimodal()
+		if self.psel >> (PSEL_BITS - 1):
+			return self.bimodal()
+		return LONG
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+from utils.Events import KINDS, read_events
+
+def main():
+	parser = argparse.ArgumentParser(description="Filter the events sim_cache.py wrote with --events")
+	parser.add_argument("events_file", type=str, help="Event file (.jsonl or binary)")
+	parser.add_argument("--level", type=int, choices=[1, 2], default=None, help="Only events of this cache level")
+	parser.add_argument("--kind", type=str, nargs="+", choices=KINDS, default=None, help="Only events of these kinds")
+	parser.add_argument("--sets", type=int, nargs=2, metavar=("FIRST", "LAST"), default=None, help="Only events of sets FIRST <= set < LAST")
+	parser.add_argument("--window", type=int, nargs=2, metavar=("START", "END"), default=None, help="Only events with START <= counter < END")
+	parser.add_argument("--tag", type=lambda value: int(value, 0), default=None, help="Only events of this tag (decimal or 0x hex)")
+	parser.add_argument("--count", action=argparse.BooleanOptionalAction, help="Print the number of matching events per kind instead of the events (default: False)")
+
+	args = parser.parse_args()
+
+	if not os.path.isfile(args.events_file):
+		print(f"{args.events_file}: not found.")
+		exit(1)
+
+	events = (event for event in read_events(args.events_file) if matches(event, args))
+	if args.count:
+		counts = dict.fromkeys(KINDS, 0)
+		for event in events:
+			counts[event["event"]] += 1
+		for kind, count in counts.items():
+			print(f"{kind}\t{count}")
+		return
+
+	for event in events:
+		print(json.dumps(event))
+
+def matches(event, args):
+	if args.level is not None and event["level"] != args.level:
+		return False
+	if args.kind and event["event"] not in args.kind:
+		return False
+	if args.sets and not args.sets[0] <= event["set"] < args.sets[1]:
+		return False
+	if args.window and not args.window[0] <= event["counter"] < args.window[1]:
+		return False
+	if args.tag is not None and event["tag"] != args.tag:
+		return False
+	return True
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,102 @@
+import argparse
+import contextlib
+import difflib
+import os
+import sys
+from sim_cache import parse_args, simulate
+from utils.Trace import LoadedTrace
+
+# In-process equivalent of run-tests.bash: every test case runs in this
+# interpreter and each distinct trace file is parsed only once.
+def main():
+	parser = argparse.ArgumentParser(description="Run every configuration of a test-cases file in one process")
+	parser.add_argument("test_cases", type=str, help="File with one sim_cache.py argument list per line")
+	parser.add_argument("--debug", action=argparse.BooleanOptionalAction, help="Also generate and compare debug output (default: False)")
+	parser.add_argument("--output-dir", type=str, default="output", help="Directory for outputN.txt files (default: output)")
+	parser.add_argument("--validation-dir", type=str, default="assets/output", help="Directory with validationN.txt files (default: assets/output)")
+	parser.add_argument("--debug-dir", type=str, default="assets/debug", help="Directory with debugN.txt files (default: assets/debug)")
+
+	args = parser.parse_args()
+
+	if not os.path.isfile(args.test_cases):
+		print(f"{args.test_cases}: not found.")
+		exit(1)
+
+	os.makedirs(args.output_dir, exist_ok=True)
+
+	with open(args.test_cases, "r") as file:
+		test_cases = [line.split() for line in file if line.strip()]
+
+	traces = {}
+	mismatches = 0
+	for i, test_case in enumerate(test_cases):
+		print(f"Test case {i}.")
+		print(f"Parameters: {' '.join(test_case)}")
+		sim_args = parse_args(test_case)
+		trace = traces.get(sim_args.trace_file)
+		if trace is None:
+			trace = traces[sim_args.trace_file] = LoadedTrace(sim_args.trace_file)
+
+		output_file = os.path.join(args.output_dir, f"output{i}.txt")
+		run_test_case(sim_args, trace, output_file)
+		print(f"Output:\t{output_file}\t\t", end="")
+		validation_file = os.path.join(args.validation_dir, f"validation{i}.txt")
+		diff_file = os.path.join(args.output_dir, f"diff-{i}.txt")
+		mismatches += not compare(output_file, validation_file, diff_file)
+
+		if args.debug:
+			sim_args.debug = True
+			debug_output_file = os.path.join(args.output_dir, f"debug{i}.txt")
+			run_test_case(sim_args, trace, debug_output_file)
+			print(f"Debug:\t{debug_output_file}\t\t", end="")
+			debug_validation_file = os.path.join(args.debug_dir, f"debug{i}.txt")
+			debug_diff_file = os.path.join(args.output_dir, f"debug-diff-{i}.txt")
+			mismatches += not compare(debug_output_file, debug_validation_file, debug_diff_file)
+
+		print("\n")
+
+	exit(1 if mismatches else 0)
+
+def run_test_case(sim_args, trace, output_file):
+	with open(output_file, "w") as file, contextlib.redirect_stdout(file):
+		try:
+			simulate(sim_args, trace)
+		except SystemExit:
+			# invalid configuration; the reason was already written to the output
+			pass
+
+# same normalization as `diff -w --strip-trailing-cr`: whitespace is ignored
+def normalize(lines):
+	return ["".join(line.split()) for line in lines]
+
+# returns False on mismatch and leaves a diff next to the output
+def compare(output_file, validation_file, diff_file):
+	if not os.path.isfile(validation_file):
+		print()
+		return True
+
+	print(f"Comparing against {validation_file}...\t", end="")
+	with open(output_file, "r") as file:
+		output = file.readlines()
+	with open(validation_file, "r") as file:
+		validation = file.readlines()
+
+	if normalize(output) == normalize(validation):
+		print_green("Match.")
+		if os.path.isfile(diff_file):
+			os.remove(diff_file)
+		return True
+
+	with open(diff_file, "w") as file:
+		file.writelines(difflib.unified_diff(output, validation, output_file, validation_file))
+	print_red(f"Mismatch. See {diff_file}")
+	return False
+
+def print_green(message):
+	print(f"\033[1;32m{message}\033[0m" if sys.stdout.isatty() else message)
+
+def print_red(message):
+	print(f"\033[1;31m{message}\033[0m" if sys.stdout.isatty() else message)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,155 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sim_cache import create_caches, create_policy, parse_args, run_trace
+from utils.Counter import Counter
+from utils.Debugger import Debugger
+from utils.Generator import PATTERNS, generate, write_chunks
+from utils.Trace import LoadedTrace
+
+# hierarchy shapes: name, L1 size, L1 associativity, L2 size, L2 associativity, inclusion
+SHAPES = (
+	("l1-direct", 1024, 1, 0, 0, 0),
+	("l1-16way", 1024, 16, 0, 0, 0),
+	("l2-non-inclusive", 1024, 2, 8192, 4, 0),
+	("l2-inclusive", 1024, 2, 8192, 4, 1),
+	("l2-16way", 1024, 8, 8192, 16, 0),
+)
+SHAPE_NAMES = [shape[0] for shape in SHAPES]
+
+BLOCK_SIZE = 16
+
+# fields identifying one benchmark across runs
+KEY = ("trace", "policy", "shape")
+
+# benchmarks whose fastest baseline run took less than this many seconds are
+# compared against --short-threshold, since timer and scheduler noise is a
+# larger share of them
+SHORT_RUN = 1.0
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure simulator throughput per policy and hierarchy shape")
+	parser.add_argument("traces", type=str, nargs="*", help="Trace files to run (default: assets/input/*_trace.txt)")
+	parser.add_argument("--synthetic", type=int, default=100000, help="Accesses per synthetic trace, 0 for none (default: 100000)")
+	parser.add_argument("--policy", type=int, nargs="+", choices=range(10), default=list(range(10)), help="Replacement policies (default: all)")
+	parser.add_argument("--shape", type=str, nargs="+", choices=SHAPE_NAMES, default=SHAPE_NAMES, help="Hierarchy shapes (default: all)")
+	parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark; the fastest is kept (default: 5)")
+	parser.add_argument("--output", type=str, default=None, help="Write results to this JSON file")
+	parser.add_argument("--baseline", type=str, default=None, help="Compare against results saved with --output")
+	parser.add_argument("--threshold", type=float, default=0.1, help="Fractional accesses/sec drop reported as a regression (default: 0.1)")
+	parser.add_argument("--short-threshold", type=float, default=0.25, help=f"--threshold for benchmarks that took under {SHORT_RUN:g}s in the baseline (default: 0.25)")
+
+	args = parser.parse_args()
+	if args.repeat < 1:
+		print("--repeat must be at least 1")
+		exit(1)
+
+	traces = args.traces or sorted(glob.glob("assets/input/*_trace.txt"))
+	for trace_file in traces:
+		if not os.path.isfile(trace_file):
+			print(f"{trace_file}: not found.")
+			exit(1)
+
+	baseline = None
+	if args.baseline:
+		with open(args.baseline, "r") as file:
+			baseline = json.load(file)
+
+	with tempfile.TemporaryDirectory() as directory:
+		if args.synthetic > 0:
+			traces = traces + write_synthetic_traces(directory, args.synthetic)
+		shapes = [shape for shape in SHAPES if shape[0] in args.shape]
+		benchmarks = [(trace_file, policy, shape) for trace_file in traces for policy in args.policy for shape in shapes]
+		results = [run_benchmark(benchmark, args.repeat) for benchmark in benchmarks]
+
+	print_results(results)
+	report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+	if args.output:
+		with open(args.output, "w") as file:
+			json.dump(report, file, indent=1)
+
+	if baseline and compare(results, baseline["results"], args.threshold, args.short_threshold):
+		exit(1)
+
+# seeded synthetic traces of every generator pattern over a 64 KiB footprint
+def write_synthetic_traces(directory, accesses):
+	trace_files = []
+	for pattern in PATTERNS:
+		trace_file = os.path.join(directory, f"synthetic-{pattern}.bin")
+		write_chunks(generate(pattern, accesses, footprint=1 << 16, stride=16), accesses, trace_file, binary=True)
+		trace_files.append(trace_file)
+	return trace_files
+
+# each run gets a fresh process so its peak RSS is its own
+def run_benchmark(benchmark, repeat):
+	runs = []
+	for _ in range(repeat):
+		with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+			runs.append(executor.submit(time_benchmark, benchmark).result())
+	result = min(runs, key=lambda run: run["seconds"])
+	result["peak_rss_kb"] = max(run["peak_rss_kb"] for run in runs)
+	return result
+
+def time_benchmark(benchmark):
+	trace_file, policy, (shape, l1_size, l1_assoc, l2_size, l2_assoc, inclusion) = benchmark
+	args = parse_args([str(value) for value in (BLOCK_SIZE, l1_size, l1_assoc, l2_size, l2_assoc, policy, inclusion)] + [trace_file])
+	Debugger.debug = False
+	trace = LoadedTrace(trace_file)
+
+	# CPU time of this process, so other load on the machine does not count
+	start = time.process_time()
+	counter = Counter()
+	policy, policyName = create_policy(args, counter, trace)
+	l1_cache, l2_cache = create_caches(args, policy)
+	setup = time.process_time() - start
+
+	start = time.process_time()
+	run_trace(trace, counter, Debugger(counter=counter), l1_cache)
+	seconds = time.process_time() - start
+
+	accesses = counter.get()
+	return {
+		"trace": os.path.basename(trace_file),
+		"policy": policyName,
+		"shape": shape,
+		"accesses": accesses,
+		"setup_seconds": round(setup, 6),
+		"seconds": round(seconds, 6),
+		"accesses_per_second": round(accesses / seconds, 1) if seconds > 0 else 0.0,
+		# kilobytes on Linux
+		"peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+	}
+
+def print_results(results):
+	print("trace\tpolicy\tshape\taccesses\tseconds\taccesses/s\tpeak RSS (KiB)")
+	for result in results:
+		print(f"{result['trace']}\t{result['policy']}\t{result['shape']}\t{result['accesses']}\t{result['seconds']:.3f}\t{result['accesses_per_second']:.0f}\t{result['peak_rss_kb']}")
+
+# prints the change against the baseline and returns the number of regressions;
+# both sides are the fastest of their runs
+def compare(results, baseline, threshold, short_threshold):
+	previous = {tuple(result[field] for field in KEY): result for result in baseline}
+	regressions = 0
+	print()
+	print("===== Comparison against baseline =====")
+	for result in results:
+		old = previous.get(tuple(result[field] for field in KEY))
+		if old is None or old["accesses_per_second"] <= 0:
+			continue
+		ratio = result["accesses_per_second"] / old["accesses_per_second"]
+		short = old["seconds"] < SHORT_RUN
+		regressed = ratio < 1 - (short_threshold if short else threshold)
+		regressions += regressed
+		flag = "\tREGRESSION" if regressed else ""
+		print(f"{result['trace']}\t{result['policy']}\t{result['shape']}\t{ratio - 1:+.1%}{flag}")
+	print(f"{regressions} regression(s) beyond {threshold:.0%} ({short_threshold:.0%} for runs under {SHORT_RUN:g}s)")
+	return regressions
+
+if __name__ == "__main__":
+	main()
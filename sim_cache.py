@@ -1,109 +1,290 @@
 import argparse
+import contextlib
+import json
 import os
 from cache.Cache import Cache
-from policies import fifo, lru, optimal, lfu, lifo, mru
+from policies import fifo, lru, optimal, lfu, lifo, mru, plru, rrip
 from utils.Counter import Counter
 from utils.Debugger import Debugger
+from utils.Checkpoint import load_checkpoint, save_checkpoint, warm_up
+from utils.Events import EventSink, EventTracer
+from utils.Trace import STDIN, LoadedTrace, TraceCursor, read_range
 
 def main():
+	args = parse_args()
+	simulate(args)
+
+def parse_args(argv=None):
 	parser = argparse.ArgumentParser(description="Cache Simulator")
 	parser.add_argument("blocksize", type=int, help="Block size in bytes")
 	parser.add_argument("l1_size", type=int, help="L1 cache size in bytes")
 	parser.add_argument("l1_assoc", type=int, help="L1 set associativity (1 is direct-mapped)")
 	parser.add_argument("l2_size", type=int, help="L2 cache size in bytes (0 for no L2 cache)")
 	parser.add_argument("l2_assoc", type=int, help="L2 set associativity (1 is direct-mapped)")
-	parser.add_argument("replacement_policy", type=int, choices=[0, 1, 2, 3, 4, 5], help="Replacement policy (0 for LRU, 1 for FIFO, 2 for optimal)")
+	parser.add_argument("replacement_policy", type=int, choices=range(10), help="Replacement policy (0 for LRU, 1 for FIFO, 2 for optimal, 3 for LFU, 4 for MRU, 5 for LIFO, 6 for tree-PLRU, 7 for SRRIP, 8 for BRRIP, 9 for DRRIP)")
 	parser.add_argument("inclusion_property", type=int, choices=[0, 1], help="Inclusion property (0 for non-inclusive, 1 for inclusive)")
-	parser.add_argument("trace_file", type=str, help="Full name of trace file including any extensions")
+	parser.add_argument("trace_file", type=str, help="Full name of trace file including any extensions (text or binary; `-` for stdin, .gz/.xz/.bz2 are decompressed)")
 	parser.add_argument("--debug", action=argparse.BooleanOptionalAction, help="Generate debug output (default: False)")
 	parser.add_argument("--skip-contents", action=argparse.BooleanOptionalAction, help="Skip printing contents of cache (default: False)")
+	parser.add_argument("--vectorize", action=argparse.BooleanOptionalAction, help="Decode the trace in chunks with NumPy before simulation (default: False)")
+	parser.add_argument("--jobs", type=int, default=1, help="Simulate disjoint ranges of sets in this many processes; single-level configurations with a policy other than BRRIP/DRRIP only (default: 1)")
+	parser.add_argument("--stream-cache", type=str, default=None, help="Directory for recorded L1 miss/writeback streams; non-inclusive L1+L2 runs replay only those into L2")
+	parser.add_argument("--out-of-core", action=argparse.BooleanOptionalAction, help="Optimal policy: read next uses from a memory-mapped sidecar file written next to the trace (default: False)")
+	parser.add_argument("--events", type=str, default=None, help="Write structured cache events to this file (.jsonl for JSON lines, binary otherwise)")
+	parser.add_argument("--event-sets", type=int, nargs=2, metavar=("FIRST", "LAST"), default=None, help="Only record events of sets FIRST <= set < LAST")
+	parser.add_argument("--event-window", type=int, nargs=2, metavar=("START", "END"), default=None, help="Only record events while START <= counter < END")
+	parser.add_argument("--analytics", type=str, default=None, help="Write 3C miss classification, per-set misses and reuse histograms of every level to this JSON file")
+	parser.add_argument("--profile", action=argparse.BooleanOptionalAction, help="Report wall time and allocation per phase and per-level cache call counts on stderr (default: False)")
+	parser.add_argument("--profile-output", type=str, default=None, help="With --profile, also dump cProfile stats of the run to this file")
+	parser.add_argument("--result-cache", type=str, default=None, help="Directory of memoized results shared between runs; a run whose trace and configuration were simulated before prints the stored report")
+	parser.add_argument("--result-cache-size", type=int, default=1 << 28, help="Bytes of results kept in --result-cache before the least recently used are removed (default: 256 MiB)")
+	parser.add_argument("--warmup", type=int, default=0, help="Simulate this many accesses without statistics before counting begins (default: 0)")
+	parser.add_argument("--stop-after", type=int, default=None, help="Stop once this many accesses of the trace have been simulated")
+	parser.add_argument("--checkpoint", type=str, default=None, help="Save the hierarchy state and trace position to this file when the run ends")
+	parser.add_argument("--restore", type=str, default=None, help="Start from a state saved with --checkpoint, at its trace position")
+	parser.add_argument("--lfu-decay", type=int, default=0, help="LFU policy: halve the access counts of a set after every this many accesses to it; 0 never ages them (default: 0)")
+	parser.add_argument("--array-storage", action=argparse.BooleanOptionalAction, help="Keep cache state in flat arrays instead of per-block objects (default: False)")
+
+	return parser.parse_args(argv)
 
-	args = parser.parse_args()
+# runs one configuration and prints its report; `trace` may be a LoadedTrace
+# shared between runs, otherwise args.trace_file is read
+def simulate(args, trace=None):
+	if trace is None:
+		trace = args.trace_file
 	Debugger.debug = args.debug
 
+	error = check_config(args)
+	if error:
+		print(error)
+		exit(1)
+
+	# runs with side outputs, over part of the trace or read from stdin are
+	# always simulated
+	partial = args.warmup or args.stop_after is not None or args.restore or args.checkpoint
+	result_cache = None
+	if args.result_cache and trace != STDIN and not (args.debug or args.events or args.analytics or args.profile or partial):
+		from utils.ResultCache import ResultCache
+		result_cache = ResultCache(args.result_cache, args.result_cache_size)
+		result_key = result_cache.key(trace, get_config(args))
+		entry = result_cache.get(result_key, contents=not args.skip_contents)
+		if entry:
+			args.policyClassName = Debugger.policyClassName = entry["policy"]
+			print_config(args)
+			if not args.skip_contents:
+				print_contents_dump(entry["contents"])
+			print_counters(entry["results"], args.l2_size > 0)
+			return None, None
+
+	# stdin can only be read once; keep it in memory if it is needed twice.
+	# --jobs shares the decoded trace with its workers, so decode it once here
+	if (trace == STDIN and args.replacement_policy == 2) or (args.jobs > 1 and args.l2_size == 0):
+		trace = LoadedTrace(trace)
+	# the counted run continues the stream where the warm-up stopped
+	elif trace == STDIN and args.warmup:
+		trace = TraceCursor(trace, text=args.debug)
+
+	profiler = None
+	if args.profile:
+		from utils.Profiler import Profiler
+		profiler = Profiler(args.profile_output)
+	phase = profiler.phase if profiler else lambda name: contextlib.nullcontext()
+
+	# parse the trace up front so that parsing is timed apart from simulation
+	if profiler and not isinstance(trace, LoadedTrace):
+		with phase("parse trace"):
+			trace = LoadedTrace(trace)
+
 	counter = Counter()
 	debugger = Debugger(counter=counter)
 
+	with phase("create policy"):
+		policy, policyName = create_policy(args, counter, trace)
+	args.policyClassName = Debugger.policyClassName = policyName
+
+	print_config(args)
+
+	event_sink = None
+	if args.events:
+		event_sink = EventSink(args.events, counter, sets=args.event_sets, window=args.event_window)
+
+	with phase("create caches"):
+		l1_cache, l2_cache = create_caches(args, policy, event_sink)
+	caches = [cache for cache in (l1_cache, l2_cache) if cache]
+
+	position = 0
+	if args.restore:
+		with phase("restore"):
+			try:
+				position = load_checkpoint(args.restore, get_config(args), caches)
+			except ValueError as error:
+				print(error)
+				exit(1)
+			counter.set(position)
+	if args.warmup:
+		with phase("warm up"):
+			position = warm_up(trace, counter, caches, position, position + args.warmup)
+	analyses = []
+	if args.analytics:
+		from analysis.MissAnalysis import MissAnalysis
+		analyses = [MissAnalysis(cache, level) for level, cache in ((1, l1_cache), (2, l2_cache)) if cache]
+	if profiler:
+		profiler.count_calls(l1_cache, 1)
+		if l2_cache:
+			profiler.count_calls(l2_cache, 2)
+
+	# debug output, events, analytics and partial runs need every access
+	# simulated in this process; calls in workers would also escape the profile
+	serial = args.debug or event_sink or analyses or partial
+	with phase("simulate"):
+		if args.jobs > 1 and l2_cache is None and policy.set_local and not (serial or profiler):
+			from utils.Parallel import simulate_partitioned
+			# workers share the next uses computed above instead of recomputing them
+			next_use = policy.next_use if args.replacement_policy == 2 and not args.out_of_core else None
+			simulate_partitioned(args, trace, l1_cache, args.jobs, next_use=next_use)
+		elif args.stream_cache and l2_cache and args.inclusion_property == 0 and not serial and args.trace_file != STDIN:
+			from utils.MissStream import simulate_with_stream
+			simulate_with_stream(args.stream_cache, trace, args, counter, l1_cache, l2_cache)
+		else:
+			run_trace(trace, counter, debugger, l1_cache, vectorize=args.vectorize, start=position, stop=args.stop_after)
+
+	if args.checkpoint:
+		with phase("checkpoint"):
+			save_checkpoint(args.checkpoint, get_config(args), counter.get(), caches)
+	if event_sink:
+		event_sink.close()
+	if analyses:
+		with open(args.analytics, "w") as file:
+			json.dump({"levels": [analysis.results() for analysis in analyses]}, file)
+
+	if(not args.skip_contents):
+		with phase("print contents"):
+			print_contents(l1_cache, l2_cache)
+
+	with phase("print results"):
+		print_results(l1_cache, l2_cache)
+
+	if result_cache:
+		contents = None if args.skip_contents else get_contents(l1_cache, l2_cache)
+		result_cache.put(result_key, {"config": get_config(args), "policy": policyName, "results": get_results(l1_cache, l2_cache), "contents": contents})
+
+	if profiler:
+		profiler.stop()
+		profiler.report()
+	return l1_cache, l2_cache
+
+# returns a message describing why the configuration is invalid, None if it is valid
+def check_config(args):
 	# check if L1_SIZE, L1_ASSOC, L2_SIZE, L2_ASSOC are all positive integers
 	if args.l1_size <= 0 or args.l1_assoc <= 0 or args.l2_size < 0 or args.l2_assoc < 0:
-		print("L1_SIZE, L1_ASSOC, L2_SIZE, L2_ASSOC must all be positive integers")
-		exit(1)
+		return "L1_SIZE, L1_ASSOC, L2_SIZE, L2_ASSOC must all be positive integers"
 
-	# check if BLOCKSIZE is a power of 2; if not, throw an error and exit
+	# check if BLOCKSIZE is a power of 2
 	if args.blocksize & (args.blocksize - 1) != 0:
-		print("BLOCKSIZE must be a power of 2")
-		exit(1)
+		return "BLOCKSIZE must be a power of 2"
 
 	# TODO:\tbetter error handling- check if num_l1_sets it's fractional etc.
-	# check if # of sets in L1 is power of 2; if not, throw an error and exit
+	# check if # of sets in L1 is power of 2
 	num_l1_sets = args.l1_size // (args.l1_assoc * args.blocksize)
 	if num_l1_sets != int(num_l1_sets):
-		print("L1 # of sets must be a power of 2")
-		exit(1)
+		return "L1 # of sets must be a power of 2"
 	num_l1_sets = int(num_l1_sets)
 
-	if num_l1_sets & (num_l1_sets - 1) != 0:
-		print("L1 # of sets must be a power of 2")
-		exit(1)
+	if num_l1_sets <= 0 or num_l1_sets & (num_l1_sets - 1) != 0:
+		return "L1 # of sets must be a power of 2"
 
-	# if l2_size != 0, check if # of sets in L1 is power of 2; if not, throw an error and exit
+	# if l2_size != 0, check if # of sets in L1 is power of 2
 	if args.l2_size != 0:
+		if args.l2_assoc == 0:
+			return "L2_ASSOC must be positive when L2_SIZE is not 0"
 		num_l2_sets = args.l2_size // (args.l2_assoc * args.blocksize)
-		if num_l2_sets & (num_l2_sets - 1) != 0:
-			print("L2 # of sets must be a power of 2")
-			exit(1)
+		if num_l2_sets <= 0 or num_l2_sets & (num_l2_sets - 1) != 0:
+			return "L2 # of sets must be a power of 2"
 
-	# `REPLACEMENT_POLICY`:\tPositive integer. 0 for LRU, 1 for FIFO, 2 for optimal.
-	# Create the appropriate replacement policy
-	policy = None
-	if args.replacement_policy == 0:
-		policy = lru.LRU(counter)
-		policyName = "LRU"
-	elif args.replacement_policy == 1:
-		policy = fifo.FIFO(counter)
-		policyName = "FIFO"
-	elif args.replacement_policy == 2:
-		policy = optimal.Optimal(counter, trace_file=args.trace_file, block_size=args.blocksize, debugger=Debugger(prefix="OPTIMAL"))
-		policyName = "optimal"
-	elif args.replacement_policy == 3:
-		policy = lfu.LFU(counter)
-		policyName = "LFU"
-	elif args.replacement_policy == 4:
-		policy = mru.MRU(counter)
-		policyName = "MRU"
-	elif args.replacement_policy == 5:
-		policy = lifo.LIFO(counter)
-		policyName = "LIFO"
-	else:
-		print("Invalid replacement policy")
-		exit(1)
+	if args.replacement_policy not in range(10):
+		return "Invalid replacement policy"
 
-	args.policyClassName = Debugger.policyClassName = policyName
+	if args.lfu_decay < 0:
+		return "--lfu-decay must not be negative"
 
-	print_config(args)
+	if args.warmup < 0:
+		return "--warmup must not be negative"
+
+	if args.stop_after is not None and args.stop_after < 0:
+		return "--stop-after must not be negative"
+
+	# partitioned workers decode their own accesses
+	if args.vectorize and args.jobs > 1 and args.l2_size == 0:
+		return "--vectorize cannot be combined with --jobs"
+
+	# the next-use sidecar is written next to the trace file
+	if args.out_of_core and args.trace_file == STDIN:
+		return "--out-of-core needs a trace file, not stdin"
 
-	# Create L1 and L2 cache instances with the appropriate configurations
-	l1_cache = Cache(args.l1_size, args.l1_assoc, args.blocksize, policy, args.inclusion_property, debugger=Debugger(prefix="L1"))
+	return None
+
+# `REPLACEMENT_POLICY`:\tPositive integer. 0 for LRU, 1 for FIFO, 2 for optimal.
+# Create the appropriate replacement policy; returns the policy and its name.
+# `next_use` is a next-use array the optimal policy computed earlier for the
+# same trace and block size
+def create_policy(args, counter, trace, next_use=None):
+	if args.replacement_policy == 0:
+		return lru.LRU(counter), "LRU"
+	if args.replacement_policy == 1:
+		return fifo.FIFO(counter), "FIFO"
+	if args.replacement_policy == 2:
+		return optimal.Optimal(counter, trace_file=trace, block_size=args.blocksize, debugger=Debugger(prefix="OPTIMAL"), out_of_core=args.out_of_core, next_use=next_use), "optimal"
+	if args.replacement_policy == 3:
+		return lfu.LFU(counter, decay_period=args.lfu_decay), "LFU"
+	if args.replacement_policy == 4:
+		return mru.MRU(counter), "MRU"
+	if args.replacement_policy == 5:
+		return lifo.LIFO(counter), "LIFO"
+	if args.replacement_policy == 6:
+		return plru.PLRU(counter), "PLRU"
+	if args.replacement_policy == 7:
+		return rrip.SRRIP(counter), "SRRIP"
+	if args.replacement_policy == 8:
+		return rrip.BRRIP(counter), "BRRIP"
+	if args.replacement_policy == 9:
+		return rrip.DRRIP(counter), "DRRIP"
+	raise ValueError(f"Invalid replacement policy: {args.replacement_policy}")
+
+# Create L1 and L2 cache instances with the appropriate configurations;
+# with an EventSink, both levels record their events into it
+def create_caches(args, policy, event_sink=None):
+	l1_debugger = EventTracer(event_sink, 1, prefix="L1") if event_sink else Debugger(prefix="L1")
+	l1_cache = Cache(args.l1_size, args.l1_assoc, args.blocksize, policy, args.inclusion_property, debugger=l1_debugger, array_storage=args.array_storage)
 	l2_cache = None
 	if args.l2_size > 0:
-		l2_cache = Cache(args.l2_size, args.l2_assoc, args.blocksize, policy, args.inclusion_property, upper_cache=l1_cache, debugger=Debugger(prefix="L2"))
-
-	# Access the cache with L1 and L2 instances
-	with open(args.trace_file, "r") as trace_file:
-		for line in trace_file:
-			# trim line and skip empty lines
-			line = line.strip()
-			if not line:
-				continue
-			operation, address = line.split()
-			counter.increment()
-			debugger.operationStart(operation, address)
-			l1_cache.access(operation, int(address, 16))
+		l2_debugger = EventTracer(event_sink, 2, prefix="L2") if event_sink else Debugger(prefix="L2")
+		l2_cache = Cache(args.l2_size, args.l2_assoc, args.blocksize, policy.copy(), args.inclusion_property, upper_cache=l1_cache, debugger=l2_debugger, array_storage=args.array_storage)
+	return l1_cache, l2_cache
 
-	if(not args.skip_contents):
-		print_contents(l1_cache, l2_cache)
-
-	print_results(l1_cache, l2_cache)
+# Access the cache with L1 and L2 instances
+# for accesses [start, stop) of the trace
+def run_trace(trace, counter, debugger, l1_cache, vectorize=False, start=0, stop=None):
+	# debug output shows every address as written in the trace, which only
+	# the text reader keeps; --vectorize does not apply
+	if Debugger.debug:
+		for operation, address, text in read_range(trace, start, stop, text=True):
+			counter.increment()
+			debugger.operationStart(operation, text)
+			l1_cache.access(operation, address)
+	elif vectorize:
+		from utils.Decoder import Decoder
+		increment = counter.increment
+		access = l1_cache.access
+		for operations, addresses, blocks in Decoder(l1_cache.offset_bits).decode(trace, start, stop):
+			for operation, address, block_number in zip(operations, addresses, blocks):
+				increment()
+				access(operation, address, block_number)
+	else:
+		increment = counter.increment
+		access = l1_cache.access
+		for operation, address in read_range(trace, start, stop):
+			increment()
+			access(operation, address)
 
 def print_config(args):
 	# `INCLUSION_PROPERTY`:\tPositive integer. 0 for non-inclusive, 1 for inclusive.
@@ -123,42 +304,83 @@ def print_config(args):
 	print("INCLUSION PROPERTY:\t", inclusion_property_name)
 	print("trace_file:\t\t", trace_file_basename)
 
+# the configuration fields that determine the results; fields without
+# effect in a single-level configuration are normalized away
+def get_config(args):
+	config = {name: getattr(args, name) for name in ("blocksize", "l1_size", "l1_assoc", "l2_size", "l2_assoc", "replacement_policy", "inclusion_property")}
+	if args.l2_size == 0:
+		config["l2_assoc"] = config["inclusion_property"] = 0
+	# only present when it changes the results, so older entries still match
+	if args.replacement_policy == 3 and args.lfu_decay:
+		config["lfu_decay"] = args.lfu_decay
+	return config
+
+def get_contents(l1_cache, l2_cache):
+	return {"l1": l1_cache.get_contents(), "l2": l2_cache.get_contents() if l2_cache else None}
+
 def print_contents(l1_cache, l2_cache):
+	print_contents_dump(get_contents(l1_cache, l2_cache))
+
+def print_contents_dump(contents):
 	print("===== L1 contents =====")
-	print(l1_cache.get_contents(), end="")
+	print(contents["l1"], end="")
 
-	if l2_cache:
+	if contents["l2"] is not None:
 		print("===== L2 contents =====")
-		print(l2_cache.get_contents(), end="")
+		print(contents["l2"], end="")
+
+# the counters reported by print_results, keyed by name
+def get_results(l1_cache, l2_cache):
+	results = {
+		"l1_reads": l1_cache.reads,
+		"l1_read_misses": l1_cache.read_misses,
+		"l1_writes": l1_cache.writes,
+		"l1_write_misses": l1_cache.write_misses,
+		"l1_miss_rate": l1_cache.get_miss_rate(),
+		"l1_writebacks": l1_cache.writebacks,
+		"l2_reads": 0,
+		"l2_read_misses": 0,
+		"l2_writes": 0,
+		"l2_write_misses": 0,
+		"l2_miss_rate": 0,
+		"l2_writebacks": 0,
+		"memory_traffic": l1_cache.memory_accesses,
+	}
+
+	if l2_cache:
+		results.update({
+			"l2_reads": l2_cache.reads,
+			"l2_read_misses": l2_cache.read_misses,
+			"l2_writes": l2_cache.writes,
+			"l2_write_misses": l2_cache.write_misses,
+			"l2_miss_rate": l2_cache.get_miss_rate(read_operations_only=True),
+			"l2_writebacks": l2_cache.writebacks,
+		})
+		results["memory_traffic"] += l2_cache.memory_accesses
+
+	return results
 
 def print_results(l1_cache, l2_cache):
-	memory_traffic = l1_cache.memory_accesses
+	print_counters(get_results(l1_cache, l2_cache), l2_cache is not None)
 
-	print("===== Simulation results (raw) =====")
-	print(f"a. number of L1 reads:\t\t{l1_cache.reads}")
-	print(f"b. number of L1 read misses:\t{l1_cache.read_misses}")
-	print(f"c. number of L1 writes:\t\t{l1_cache.writes}")
-	print(f"d. number of L1 write misses:\t{l1_cache.write_misses}")
-	print(f"e. L1 miss rate:\t\t{l1_cache.get_miss_rate():.6f}")
-	print(f"f. number of L1 writebacks:\t{l1_cache.writebacks}")
+def print_counters(results, has_l2_cache):
+	# without an L2 cache the miss rate is printed as a plain 0
+	l2_miss_rate = f"{results['l2_miss_rate']:.6f}" if has_l2_cache else "0"
 
-	if l2_cache:
-		memory_traffic += l2_cache.memory_accesses
-		print(f"g. number of L2 reads:\t\t{l2_cache.reads}")
-		print(f"h. number of L2 read misses:\t{l2_cache.read_misses}")
-		print(f"i. number of L2 writes:\t\t{l2_cache.writes}")
-		print(f"j. number of L2 write misses:\t{l2_cache.write_misses}")
-		print(f"k. L2 miss rate:\t\t{l2_cache.get_miss_rate(read_operations_only=True):.6f}")
-		print(f"l. number of L2 writebacks:\t{l2_cache.writebacks}")
-	else:
-		print("g. number of L2 reads:\t\t0")
-		print("h. number of L2 read misses:\t0")
-		print("i. number of L2 writes:\t\t0")
-		print("j. number of L2 write misses:\t0")
-		print("k. L2 miss rate:\t\t0")
-		print("l. number of L2 writebacks:\t0")
-
-	print(f"m. total memory traffic:\t{memory_traffic}")
+	print("===== Simulation results (raw) =====")
+	print(f"a. number of L1 reads:\t\t{results['l1_reads']}")
+	print(f"b. number of L1 read misses:\t{results['l1_read_misses']}")
+	print(f"c. number of L1 writes:\t\t{results['l1_writes']}")
+	print(f"d. number of L1 write misses:\t{results['l1_write_misses']}")
+	print(f"e. L1 miss rate:\t\t{results['l1_miss_rate']:.6f}")
+	print(f"f. number of L1 writebacks:\t{results['l1_writebacks']}")
+	print(f"g. number of L2 reads:\t\t{results['l2_reads']}")
+	print(f"h. number of L2 read misses:\t{results['l2_read_misses']}")
+	print(f"i. number of L2 writes:\t\t{results['l2_writes']}")
+	print(f"j. number of L2 write misses:\t{results['l2_write_misses']}")
+	print(f"k. L2 miss rate:\t\t{l2_miss_rate}")
+	print(f"l. number of L2 writebacks:\t{results['l2_writebacks']}")
+	print(f"m. total memory traffic:\t{results['memory_traffic']}")
 
 if __name__ == "__main__":
 	main()
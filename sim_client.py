@@ -0,0 +1,54 @@
+import argparse
+import json
+import socket
+import sys
+from sim_cache import parse_args, print_config, print_counters
+
+# Sends configurations to sim_server.py and prints the reports like
+# `sim_cache.py --skip-contents` would.
+def main():
+	parser = argparse.ArgumentParser(description="Run simulations on a running sim_server.py")
+	parser.add_argument("--socket", type=str, default="sim_server.sock", help="Unix socket of the server (default: sim_server.sock)")
+	parser.add_argument("--port", type=int, default=None, help="Connect to this localhost TCP port instead of a Unix socket")
+	parser.add_argument("--batch", type=str, default=None, help="File with one sim_cache.py argument list per line, sent as one batch")
+	parser.add_argument("arguments", nargs=argparse.REMAINDER, help="sim_cache.py arguments of a single configuration")
+
+	args = parser.parse_args()
+
+	if args.batch:
+		with open(args.batch, "r") as file:
+			configurations = [line.split() for line in file if line.strip()]
+	elif args.arguments:
+		configurations = [args.arguments]
+	else:
+		parser.error("either sim_cache.py arguments or --batch is required")
+	for configuration in configurations:
+		# fail early, and on this side, on malformed arguments
+		parse_args(configuration)
+
+	if args.port is not None:
+		connection = socket.create_connection(("127.0.0.1", args.port))
+	else:
+		connection = socket.socket(socket.AF_UNIX)
+		connection.connect(args.socket)
+
+	with connection, connection.makefile("rwb") as stream:
+		request = {"batch": [{"args": configuration} for configuration in configurations]}
+		stream.write(json.dumps(request).encode() + b"\n")
+		stream.flush()
+		responses = json.loads(stream.readline())["batch"]
+
+	failed = False
+	for configuration, response in zip(configurations, responses):
+		if "error" in response:
+			print(response["error"], file=sys.stderr)
+			failed = True
+			continue
+		sim_args = parse_args(configuration)
+		sim_args.policyClassName = response["policy"]
+		print_config(sim_args)
+		print_counters(response["results"], sim_args.l2_size > 0)
+	exit(1 if failed else 0)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,81 @@
+import argparse
+from analysis.Shards import Shards
+from analysis.StackDistance import StackDistance
+from sim_cache import create_caches, create_policy, parse_args, run_trace
+from utils.Counter import Counter
+from utils.Debugger import Debugger
+
+def main():
+	parser = argparse.ArgumentParser(description="LRU miss-ratio curves from a single pass over a trace")
+	parser.add_argument("blocksize", type=int, help="Block size in bytes")
+	parser.add_argument("trace_file", type=str, help="Full name of trace file including any extensions")
+	parser.add_argument("--min-size", type=int, default=1024, help="Smallest cache size in bytes (default: 1024)")
+	parser.add_argument("--max-size", type=int, default=1048576, help="Largest cache size in bytes (default: 1048576)")
+	parser.add_argument("--sample-rate", type=float, default=None, help="Approximate fully associative curve from a SHARDS sample of this fraction of the blocks")
+	parser.add_argument("--sample-size", type=int, default=None, help="Approximate fully associative curve from a SHARDS sample of at most this many blocks")
+	parser.add_argument("--validate", action=argparse.BooleanOptionalAction, help="With sampling, also simulate every size exactly with an LRU Cache and report the error (default: False)")
+
+	args = parser.parse_args()
+
+	for value, name in ((args.blocksize, "BLOCKSIZE"), (args.min_size, "MIN_SIZE"), (args.max_size, "MAX_SIZE")):
+		if value <= 0 or value & (value - 1) != 0:
+			print(f"{name} must be a power of 2")
+			exit(1)
+
+	if args.min_size < args.blocksize or args.max_size < args.min_size:
+		print("BLOCKSIZE <= MIN_SIZE <= MAX_SIZE must hold")
+		exit(1)
+
+	if args.sample_rate is not None and not 0 < args.sample_rate <= 1:
+		print("SAMPLE_RATE must be in (0, 1]")
+		exit(1)
+	if args.sample_size is not None and args.sample_size <= 0:
+		print("SAMPLE_SIZE must be positive")
+		exit(1)
+
+	if args.sample_rate is None and args.sample_size is None:
+		analysis = StackDistance(args.blocksize, args.max_size)
+		analysis.read_trace_file(args.trace_file).analyze()
+		print_curve(analysis, args.min_size)
+		return
+
+	analysis = Shards(args.blocksize, args.max_size, rate=args.sample_rate, max_samples=args.sample_size)
+	analysis.read_trace_file(args.trace_file)
+	print_curve(analysis, args.min_size)
+	print(f"sampling rate:\t{analysis.rate():.6f}\ttracked blocks:\t{len(analysis.last_access)}")
+	if args.validate:
+		print_validation(analysis, args.min_size, args.trace_file)
+
+def print_curve(analysis, min_size):
+	accesses = analysis.accesses()
+	print("===== LRU miss-ratio curve =====")
+	print("size\tassoc\tsets\tmisses\tmiss rate")
+	for size, associativity, misses in analysis.miss_ratio_curve(min_size):
+		num_sets = size // (associativity * analysis.block_size)
+		miss_rate = round(misses / accesses, 6) if accesses else 0
+		print(f"{size}\t{associativity}\t{num_sets}\t{misses}\t{miss_rate:.6f}")
+
+# compares the estimates with exact single-level LRU simulations
+def print_validation(analysis, min_size, trace_file):
+	accesses = analysis.accesses()
+	errors = []
+	print("===== Validation against exact LRU simulation =====")
+	print("size\testimated\texact\t\terror")
+	for size, associativity, misses in analysis.miss_ratio_curve(min_size):
+		exact = simulate_lru(analysis.block_size, size, associativity, trace_file)
+		error = (misses - exact) / accesses if accesses else 0
+		errors.append(abs(error))
+		print(f"{size}\t{misses / accesses:.6f}\t{exact / accesses:.6f}\t{error:+.6f}")
+	print(f"mean absolute error:\t{sum(errors) / len(errors):.6f}")
+
+def simulate_lru(block_size, size, associativity, trace_file):
+	args = parse_args([str(value) for value in (block_size, size, associativity, 0, 0, 0, 0)] + [trace_file])
+	Debugger.debug = False
+	counter = Counter()
+	policy, policyName = create_policy(args, counter, trace_file)
+	l1_cache, l2_cache = create_caches(args, policy)
+	run_trace(trace_file, counter, Debugger(counter=counter), l1_cache)
+	return l1_cache.read_misses + l1_cache.write_misses
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import atexit
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from sim_cache import check_config, create_caches, create_policy, get_results, parse_args, run_trace
+from utils.Counter import Counter
+from utils.Debugger import Debugger
+from utils.SharedTrace import SharedTrace
+from utils.Trace import STDIN, LoadedTrace
+
+# Local simulation daemon. Clients send one JSON object per line and get one
+# JSON object per line back:
+#   {"args": [<sim_cache.py arguments>]}
+#     -> {"policy": <name>, "results": <get_results counters>} or {"error": <message>}
+#   {"batch": [<request>, ...]} -> {"batch": [<response>, ...]}
+# Besides the configuration arguments, only --lfu-decay, --array-storage and
+# options that cannot change the counters are accepted; any other option
+# is answered with an error rather than silently ignored.
+#
+# Decoded traces stay resident in shared memory for as long as their file is
+# unchanged; every worker process attaches to them once and keeps the
+# optimal policy's next-use arrays it computed for them.
+def main():
+	parser = argparse.ArgumentParser(description="Serve cache simulations over a Unix socket or a localhost port")
+	parser.add_argument("--socket", type=str, default="sim_server.sock", help="Unix socket to listen on (default: sim_server.sock)")
+	parser.add_argument("--port", type=int, default=None, help="Listen on this localhost TCP port instead of a Unix socket")
+	parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+
+	args = parser.parse_args()
+	asyncio.run(serve(args))
+
+async def serve(args):
+	server = SimulationServer(args.workers)
+	if args.port is not None:
+		listener = await asyncio.start_server(server.handle, "127.0.0.1", args.port)
+		address = f"127.0.0.1:{args.port}"
+	else:
+		with contextlib.suppress(FileNotFoundError):
+			os.remove(args.socket)
+		listener = await asyncio.start_unix_server(server.handle, args.socket)
+		address = args.socket
+
+	stop = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for signal_number in (signal.SIGINT, signal.SIGTERM):
+		loop.add_signal_handler(signal_number, stop.set)
+
+	print(f"Serving on {address}", flush=True)
+	try:
+		async with listener:
+			await stop.wait()
+	finally:
+		server.close()
+		if args.port is None:
+			with contextlib.suppress(FileNotFoundError):
+				os.remove(args.socket)
+
+class SimulationServer(object):
+	def __init__(self, workers):
+		# forking a process with a running event loop and threads is unsafe
+		self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker)
+		# absolute trace path -> (size, mtime, SharedTrace)
+		self.traces = {}
+		# absolute trace path -> task loading it, so concurrent requests load once
+		self.loading = {}
+
+	async def handle(self, reader, writer):
+		try:
+			while line := await reader.readline():
+				try:
+					request = json.loads(line)
+					if "batch" in request:
+						response = {"batch": await asyncio.gather(*(self.simulate(item) for item in request["batch"]))}
+					else:
+						response = await self.simulate(request)
+				except (ValueError, TypeError) as error:
+					response = {"error": f"invalid request: {error}"}
+				writer.write(json.dumps(response).encode() + b"\n")
+				await writer.drain()
+		finally:
+			writer.close()
+
+	# the response to one request; no failure may escape and end the server
+	async def simulate(self, request):
+		if not isinstance(request, dict) or not isinstance(request.get("args"), list):
+			return {"error": "invalid request: expected {\"args\": [...]}"}
+		try:
+			return await self.run(request)
+		except (Exception, SystemExit) as error:
+			return {"error": f"simulation failed: {error!r}"}
+
+	async def run(self, request):
+		argv = [str(argument) for argument in request["args"]]
+		try:
+			# argparse reports malformed arguments on stderr and exits
+			with contextlib.redirect_stderr(io.StringIO()) as usage:
+				args = parse_args(argv)
+		except SystemExit:
+			return {"error": usage.getvalue().strip().splitlines()[-1]}
+		error = check_config(args)
+		if error:
+			return {"error": error}
+		option = unsupported_option(args)
+		if option:
+			return {"error": f"{option} is not supported by the server"}
+		if args.trace_file == STDIN or not os.path.isfile(args.trace_file):
+			return {"error": f"{args.trace_file}: not found."}
+
+		shared_trace = await self.trace(os.path.abspath(args.trace_file))
+		args.trace_file = shared_trace.trace_file
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(self.executor, run_request, shared_trace.descriptor(), args)
+
+	# the resident copy of a trace, loaded again if the file changed
+	async def trace(self, trace_file):
+		stat = os.stat(trace_file)
+		resident = self.traces.get(trace_file)
+		if resident and resident[:2] == (stat.st_size, stat.st_mtime_ns):
+			return resident[2]
+
+		task = self.loading.get(trace_file)
+		if task is None:
+			task = self.loading[trace_file] = asyncio.create_task(self.load(trace_file, stat))
+		try:
+			return await task
+		finally:
+			self.loading.pop(trace_file, None)
+
+	async def load(self, trace_file, stat):
+		trace = await asyncio.to_thread(LoadedTrace, trace_file)
+		shared_trace = SharedTrace(trace)
+		previous = self.traces.get(trace_file)
+		self.traces[trace_file] = (stat.st_size, stat.st_mtime_ns, shared_trace)
+		if previous:
+			# workers still attached keep their mapping until they drop it
+			previous[2].close()
+		return shared_trace
+
+	def close(self):
+		self.executor.shutdown(cancel_futures=True)
+		for size, mtime, shared_trace in self.traces.values():
+			shared_trace.close()
+
+# sim_cache.py options the workers honor, and options without effect on the
+# counters (the workers simulate serially, in memory, without output)
+HONORED_OPTIONS = {"lfu_decay", "array_storage"}
+IGNORED_OPTIONS = {"skip_contents", "vectorize", "jobs", "out_of_core", "result_cache", "result_cache_size"}
+
+# the first option set in `args` that the server can not honor, None if none is
+def unsupported_option(args):
+	positionals = [str(getattr(args, name)) for name in ("blocksize", "l1_size", "l1_assoc", "l2_size", "l2_assoc", "replacement_policy", "inclusion_property")]
+	defaults = vars(parse_args(positionals + [args.trace_file]))
+	for name, value in vars(args).items():
+		# --no-<flag> is the default of a flag left out
+		if value is False and defaults[name] is None:
+			continue
+		if name not in HONORED_OPTIONS and name not in IGNORED_OPTIONS and value != defaults[name]:
+			return "--" + name.replace("_", "-")
+	return None
+
+# per worker process: shared memory name -> (shared memory block, trace)
+worker_traces = {}
+# per worker process: (shared memory name, block size) -> optimal next uses
+worker_next_uses = {}
+
+def init_worker():
+	atexit.register(detach_all)
+
+def detach_all():
+	for memory, trace in worker_traces.values():
+		SharedTrace.detach(memory, trace)
+	worker_traces.clear()
+
+def attach(descriptor):
+	name, trace_file, count = descriptor
+	if name not in worker_traces:
+		# drop older copies of the same trace file
+		for stale_name, (memory, trace) in list(worker_traces.items()):
+			if trace.trace_file == trace_file:
+				del worker_traces[stale_name]
+				for key in [key for key in worker_next_uses if key[0] == stale_name]:
+					del worker_next_uses[key]
+				SharedTrace.detach(memory, trace)
+		worker_traces[name] = SharedTrace.attach(descriptor)
+	return worker_traces[name][1]
+
+# `args` as parsed by the server, naming the resident trace
+def run_request(descriptor, args):
+	trace = attach(descriptor)
+	Debugger.debug = False
+
+	counter = Counter()
+	next_use_key = (descriptor[0], args.blocksize)
+	policy, policyName = create_policy(args, counter, trace, next_use=worker_next_uses.get(next_use_key))
+	if args.replacement_policy == 2:
+		worker_next_uses[next_use_key] = policy.next_use
+	l1_cache, l2_cache = create_caches(args, policy)
+	run_trace(trace, counter, Debugger(counter=counter), l1_cache)
+	return {"policy": policyName, "results": get_results(l1_cache, l2_cache)}
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,118 @@
+import argparse
+import csv
+import functools
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from sim_cache import check_config, create_caches, create_policy, get_config, get_results, parse_args, run_trace
+from utils.Counter import Counter
+from utils.Debugger import Debugger
+from utils.ResultCache import ResultCache
+from utils.SharedTrace import SharedTrace, attach_trace, attached_trace
+from utils.Trace import LoadedTrace
+
+# configuration fields, in sim_cache.py argument order
+PARAMETERS = ("blocksize", "l1_size", "l1_assoc", "l2_size", "l2_assoc", "replacement_policy", "inclusion_property")
+
+def main():
+	parser = argparse.ArgumentParser(description="Sweep a grid of cache configurations over one trace")
+	parser.add_argument("trace_file", type=str, help="Full name of trace file including any extensions (text or binary)")
+	parser.add_argument("--blocksize", type=int, nargs="+", default=[16], help="Block sizes in bytes")
+	parser.add_argument("--l1-size", type=int, nargs="+", default=[1024], help="L1 cache sizes in bytes")
+	parser.add_argument("--l1-assoc", type=int, nargs="+", default=[1], help="L1 set associativities")
+	parser.add_argument("--l2-size", type=int, nargs="+", default=[0], help="L2 cache sizes in bytes (0 for no L2 cache)")
+	parser.add_argument("--l2-assoc", type=int, nargs="+", default=[1], help="L2 set associativities")
+	parser.add_argument("--policy", type=int, nargs="+", choices=range(10), default=[0], help="Replacement policies")
+	parser.add_argument("--inclusion", type=int, nargs="+", choices=[0, 1], default=[0], help="Inclusion properties")
+	parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+	parser.add_argument("--output", type=str, default=None, help="Write results to a .csv or .json file instead of stdout")
+	parser.add_argument("--result-cache", type=str, default=None, help="Directory of memoized results shared with sim_cache.py --result-cache; configurations found there are not simulated again")
+
+	args = parser.parse_args()
+
+	configurations = expand_grid(args)
+	if not configurations:
+		print("No valid configuration in the grid")
+		exit(1)
+
+	trace = LoadedTrace(args.trace_file)
+	with SharedTrace(trace) as shared_trace:
+		del trace
+		with ProcessPoolExecutor(max_workers=args.workers, initializer=attach_trace, initargs=(shared_trace.descriptor(),)) as executor:
+			rows = list(executor.map(functools.partial(run_configuration, result_cache=args.result_cache), configurations))
+
+	write_results(rows, args.output)
+
+# every valid combination of the grid, normalized like sim_cache.py's
+# get_config so that points only differing in L2 associativity or
+# inclusion without an L2 run once
+def expand_grid(args):
+	grid = (args.blocksize, args.l1_size, args.l1_assoc, args.l2_size, args.l2_assoc, args.policy, args.inclusion)
+	configurations = []
+	for values in itertools.product(*grid):
+		configuration_arguments = configuration_args(dict(zip(PARAMETERS, values)), args.trace_file)
+		configuration = get_config(configuration_arguments)
+		if configuration in configurations:
+			continue
+
+		error = check_config(configuration_arguments)
+		if error:
+			print(f"Skipping {' '.join(str(value) for value in values)}: {error}", file=sys.stderr)
+			continue
+		configurations.append(configuration)
+	return configurations
+
+def configuration_args(configuration, trace_file):
+	argv = [str(configuration[parameter]) for parameter in PARAMETERS]
+	return parse_args(argv + [trace_file])
+
+# per worker process: block size -> optimal next uses of the shared trace
+worker_next_uses = {}
+
+def run_configuration(configuration, result_cache=None):
+	trace = attached_trace()
+	args = configuration_args(configuration, trace.trace_file)
+	Debugger.debug = False
+
+	entry = None
+	if result_cache:
+		result_cache = ResultCache(result_cache)
+		result_key = result_cache.key(trace, get_config(args))
+		entry = result_cache.get(result_key)
+
+	if entry is None:
+		counter = Counter()
+		policy, policyName = create_policy(args, counter, trace, next_use=worker_next_uses.get(args.blocksize))
+		if args.replacement_policy == 2:
+			worker_next_uses[args.blocksize] = policy.next_use
+		l1_cache, l2_cache = create_caches(args, policy)
+		run_trace(trace, counter, Debugger(counter=counter), l1_cache)
+		entry = {"config": get_config(args), "policy": policyName, "results": get_results(l1_cache, l2_cache), "contents": None}
+		if result_cache:
+			result_cache.put(result_key, entry)
+
+	row = {"trace_file": os.path.basename(trace.trace_file)}
+	row.update(configuration)
+	row["replacement_policy"] = entry["policy"]
+	row.update(entry["results"])
+	return row
+
+def write_results(rows, output_file):
+	if output_file and output_file.endswith(".json"):
+		with open(output_file, "w") as file:
+			json.dump(rows, file, indent=1)
+		return
+
+	file = open(output_file, "w", newline="") if output_file else sys.stdout
+	try:
+		writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+		writer.writeheader()
+		writer.writerows(rows)
+	finally:
+		if output_file:
+			file.close()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,167 @@
+import json
+import os
+import struct
+import sys
+from array import array
+
+from cache.Cache import COUNTERS
+from utils.Trace import read_range
+
+# Snapshot of an L1/L2 hierarchy in the middle of a trace:
+#   8-byte magic, u32 length of a JSON header, the header, then raw sections
+# The header holds the configuration, the trace position, the byte order and
+# per level the counters and the (name, typecode, length) of its sections:
+#   tags, addresses, valid, dirty: one entry per way, set by set
+#   next_fill: next untouched way of every set
+#   metadata:<key>: policy metadata of every way (valid ways only matter)
+#   policy:<name>: state the policy keeps outside the blocks, see Policy.state
+# Free ways and the block lookup dict are rebuilt from these on restore.
+MAGIC = b"PCSCKP01"
+PREFIX = struct.Struct("<8sI")
+
+def cache_sections(cache):
+	memory = cache.memory
+	if cache.array_storage:
+		slots = len(memory.valid)
+		tags, valid, dirty = memory.tags, memory.valid, memory.dirty
+		addresses = array('Q', ((tags[slot] << cache.index_bits | slot // cache.associativity) << cache.offset_bits for slot in range(slots)))
+		metadata = memory.metadata
+	else:
+		blocks = [block for memory_set in memory for block in memory_set]
+		tags = array('Q', (block.tag for block in blocks))
+		addresses = array('Q', (block.address or 0 for block in blocks))
+		valid = bytearray(block.valid for block in blocks)
+		dirty = bytearray(block.dirty for block in blocks)
+		metadata = {}
+		for slot, block in enumerate(blocks):
+			if not block.valid:
+				continue
+			for key, value in block.metadata.items():
+				vector = metadata.get(key)
+				if vector is None:
+					vector = metadata[key] = array('d' if isinstance(value, float) else 'q', bytes(8 * len(blocks)))
+				vector[slot] = value
+
+	sections = [("tags", tags), ("addresses", addresses), ("valid", array('B', valid)), ("dirty", array('B', dirty)), ("next_fill", cache.next_fill)]
+	sections += [(f"metadata:{key}", vector) for key, vector in metadata.items()]
+	sections += [(f"policy:{name}", vector) for name, vector in cache.policy.state().items()]
+	return sections
+
+def restore_cache(cache, counters, sections):
+	for name in COUNTERS:
+		setattr(cache, name, counters[name])
+
+	tags, addresses, valid, dirty = sections["tags"], sections["addresses"], sections["valid"], sections["dirty"]
+	metadata = {name.split(":", 1)[1]: vector for name, vector in sections.items() if name.startswith("metadata:")}
+	associativity = cache.associativity
+	cache.next_fill = sections["next_fill"]
+	cache.ways = {}
+	cache.free_ways = {}
+
+	if cache.array_storage:
+		memory = cache.memory
+		memory.tags = tags
+		memory.valid = bytearray(valid)
+		memory.dirty = bytearray(dirty)
+		memory.metadata = metadata
+	for index, memory_set in enumerate(cache.memory):
+		for way in range(associativity):
+			slot = index * associativity + way
+			if valid[slot]:
+				cache.ways[tags[slot] << cache.index_bits | index] = way
+			elif way < cache.next_fill[index]:
+				# appended in ascending order, so already a heap
+				cache.free_ways.setdefault(index, []).append(way)
+			if cache.array_storage:
+				continue
+			block = memory_set[way]
+			block.tag = tags[slot]
+			block.valid = bool(valid[slot])
+			block.dirty = bool(dirty[slot])
+			block.index = index
+			block.address = addresses[slot]
+			block.block_address = addresses[slot] >> cache.offset_bits << cache.offset_bits
+			block.metadata = {key: vector[slot] for key, vector in metadata.items()} if valid[slot] else {}
+
+	cache.policy.restore({name.split(":", 1)[1]: vector for name, vector in sections.items() if name.startswith("policy:")})
+
+def save_checkpoint(checkpoint_file, config, position, caches):
+	header = {"config": config, "position": position, "byteorder": sys.byteorder, "levels": []}
+	payload = []
+	for cache in caches:
+		sections = cache_sections(cache)
+		header["levels"].append({
+			"counters": {name: getattr(cache, name) for name in COUNTERS},
+			"sections": [[name, vector.typecode, len(vector)] for name, vector in sections],
+		})
+		payload += [vector.tobytes() for name, vector in sections]
+
+	encoded = json.dumps(header).encode()
+	with open(checkpoint_file + ".tmp", "wb") as file:
+		file.write(PREFIX.pack(MAGIC, len(encoded)))
+		file.write(encoded)
+		file.writelines(payload)
+	os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+# restores `caches` from a snapshot of the same configuration and returns
+# the trace position it was taken at; unreadable, truncated or corrupt
+# snapshots raise ValueError before any cache is touched
+def load_checkpoint(checkpoint_file, config, caches):
+	try:
+		with open(checkpoint_file, "rb") as file:
+			magic, length = PREFIX.unpack(file.read(PREFIX.size))
+			if magic != MAGIC:
+				raise ValueError(f"{checkpoint_file}: not a checkpoint")
+			header = json.loads(file.read(length))
+			if header["config"] != config:
+				raise ValueError(f"{checkpoint_file}: taken with a different configuration")
+			if header["byteorder"] != sys.byteorder or len(header["levels"]) != len(caches):
+				raise ValueError(f"{checkpoint_file}: incompatible checkpoint")
+
+			position = header["position"]
+			levels = []
+			for level in header["levels"]:
+				sections = {}
+				for name, typecode, count in level["sections"]:
+					vector = array(typecode)
+					data = file.read(count * vector.itemsize)
+					if len(data) != count * vector.itemsize:
+						raise ValueError(f"{checkpoint_file}: truncated checkpoint")
+					vector.frombytes(data)
+					sections[name] = vector
+				levels.append((level["counters"], sections))
+	except OSError as error:
+		raise ValueError(f"{checkpoint_file}: {error.strerror}")
+	except struct.error:
+		raise ValueError(f"{checkpoint_file}: truncated checkpoint")
+	except (KeyError, TypeError):
+		raise ValueError(f"{checkpoint_file}: corrupt checkpoint")
+
+	for cache, (counters, sections) in zip(caches, levels):
+		restore_cache(cache, counters, sections)
+	return position
+
+# Simulates accesses [start, stop) of the trace without statistics: debug
+# output, events and the like stay off, and the counters of every cache
+# are zeroed afterwards. Returns the position reached.
+def warm_up(trace, counter, caches, start, stop):
+	methods = ("access", "evict", "invalidate")
+	bound = [(cache, {name: vars(cache)[name] for name in methods if name in vars(cache)}) for cache in caches]
+	for cache in caches:
+		cache.access, cache.evict, cache.invalidate = cache.access_fast, cache.evict_fast, cache.invalidate_fast
+
+	increment = counter.increment
+	access = caches[0].access
+	for operation, address in read_range(trace, start, stop):
+		increment()
+		access(operation, address)
+
+	for cache, attributes in bound:
+		for name in methods:
+			if name in attributes:
+				setattr(cache, name, attributes[name])
+			else:
+				delattr(cache, name)
+		for name in COUNTERS:
+			setattr(cache, name, 0)
+	return counter.get()
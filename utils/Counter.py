@@ -3,10 +3,17 @@ class Counter:
 		self.value = 0
 		self.subscribers = []
 
+	# subscribers are notified through increment_and_notify,
+	# so a counter nobody listens to does no extra work per tick
 	def subscribe(self, callback):
 		self.subscribers.append(callback)
+		self.increment = self.increment_and_notify
 
 	def increment(self):
+		self.value += 1
+		return self.value
+
+	def increment_and_notify(self):
 		self.value += 1
 		for callback in self.subscribers:
 			callback(self.value)
@@ -15,6 +22,10 @@ class Counter:
 	def get(self):
 		return self.value
 
+	def set(self, value):
+		self.value = value
+		return self
+
 	def reset(self):
 		self.value = 0
 		return self
@@ -12,14 +12,21 @@ class Debugger:
 		self.counter = counter
 		self.prefix = prefix
 
+	# whether caches using this debugger need their instrumented access path
+	def enabled(self):
+		return Debugger.debug
+
 	def log(self, *args):
 		if not Debugger.debug: return
 		print(self.prefix, *args)
 
+	# `address` is the address text from the trace, or an int printed in hex
 	def operationStart(self, operation, address):
 		if not Debugger.debug: return
 		if not self.counter: return
 		program_counter = self.counter.get()
+		if not isinstance(address, str):
+			address = f"{address:x}"
 		print("----------------------------------------")
 		print(f"# {program_counter} : {getOperationName(operation)} {address}")
 
@@ -0,0 +1,112 @@
+from itertools import islice
+
+import numpy as np
+
+from utils.Trace import HEADER, MAGIC, OPERATIONS, READ_SIZE, LoadedTrace, TraceCursor, is_binary_trace, is_regular_file, open_trace, read_head
+
+# accesses decoded per chunk
+CHUNK_SIZE = 1 << 16
+
+# operation names indexed by the binary operation bit (1 for writes)
+OPERATION_NAMES = np.array(OPERATIONS, dtype=object)
+
+# Pipeline stage that decodes whole chunks of a trace at once. Each chunk is
+# (operations, addresses, block numbers) as plain lists, ready to be zipped
+# and passed to Cache.access; the block number (address >> offset bits) is
+# the same at every level, and each level takes its index and tag from it.
+# Binary traces are split with vectorized shifts and masks; text traces are
+# tokenized a chunk of lines at a time instead of line by line.
+class Decoder(object):
+	def __init__(self, offset_bits, chunk_size=CHUNK_SIZE):
+		self.offset_bits = offset_bits
+		self.chunk_size = chunk_size
+
+	# chunks of accesses [start, stop) of the trace
+	def decode(self, trace_file, start=0, stop=None):
+		if isinstance(trace_file, TraceCursor):
+			yield from self.read_access_chunks(trace_file.read(start, stop))
+			return
+		position = 0
+		for operations, addresses, blocks in self.read_chunks(trace_file):
+			end = position + len(addresses)
+			if end > start:
+				if position < start or (stop is not None and end > stop):
+					first = max(start - position, 0)
+					last = len(addresses) if stop is None else min(stop - position, len(addresses))
+					operations, addresses, blocks = operations[first:last], addresses[first:last], blocks[first:last]
+				yield operations, addresses, blocks
+			position = end
+			if stop is not None and position >= stop:
+				return
+
+	def read_chunks(self, trace_file):
+		if isinstance(trace_file, LoadedTrace):
+			return self.read_loaded_chunks(trace_file)
+		if is_regular_file(trace_file) and is_binary_trace(trace_file):
+			return self.read_binary_chunks(trace_file)
+		return self.read_stream_chunks(trace_file)
+
+	# operation bits and addresses as uint8 and uint64 arrays
+	def decode_records(self, operations, addresses):
+		blocks = addresses >> np.uint64(self.offset_bits)
+		return OPERATION_NAMES[operations].tolist(), addresses.tolist(), blocks.tolist()
+
+	def read_loaded_chunks(self, trace):
+		operations = np.frombuffer(trace.operations, dtype=np.uint8)
+		addresses = np.frombuffer(trace.addresses, dtype=np.uint64)
+		for start in range(0, len(trace), self.chunk_size):
+			yield self.decode_records(operations[start:start + self.chunk_size], addresses[start:start + self.chunk_size])
+
+	def read_binary_chunks(self, trace_file):
+		with open(trace_file, "rb") as file:
+			magic, count = HEADER.unpack(file.read(HEADER.size))
+			while count > 0:
+				records = np.fromfile(file, dtype="<u8", count=min(self.chunk_size, count))
+				if len(records) == 0:
+					raise ValueError(f"{trace_file}: truncated binary trace")
+				count -= len(records)
+				yield self.decode_records(records & np.uint64(1), records >> np.uint64(1))
+
+	def read_stream_chunks(self, trace_file):
+		with open_trace(trace_file) as file:
+			head = read_head(file)
+			if head[:len(MAGIC)] == MAGIC:
+				yield from self.read_binary_stream_chunks(file, trace_file, head)
+			else:
+				yield from self.read_text_chunks(file, head)
+
+	def read_binary_stream_chunks(self, file, trace_file, header):
+		if len(header) < HEADER.size:
+			raise ValueError(f"{trace_file}: truncated binary trace")
+		magic, count = HEADER.unpack(header)
+		while count > 0:
+			chunk = file.read(min(count, self.chunk_size) * 8)
+			if not chunk or len(chunk) % 8:
+				raise ValueError(f"{trace_file}: truncated binary trace")
+			records = np.frombuffer(chunk, dtype="<u8")
+			count -= len(records)
+			yield self.decode_records((records & np.uint64(1)).astype(np.uint8), records >> np.uint64(1))
+
+	# chunks of (operation, address) pairs that were already decoded one by one
+	def read_access_chunks(self, accesses):
+		offset_bits = self.offset_bits
+		while True:
+			chunk = list(islice(accesses, self.chunk_size))
+			if not chunk:
+				return
+			operations, addresses = zip(*chunk)
+			yield operations, addresses, [address >> offset_bits for address in addresses]
+
+	# `head` is the start of the stream, already read from `file`
+	def read_text_chunks(self, file, head):
+		offset_bits = self.offset_bits
+		# complete the line head ends in
+		data = head + file.readline()
+		while data:
+			tokens = data.split()
+			operations = tokens[0::2]
+			if len(tokens) % 2 or not set(operations) <= {b"r", b"w"}:
+				raise ValueError(f"malformed trace line in: {data[:80]!r}")
+			addresses = [int(address, 16) for address in tokens[1::2]]
+			yield [OPERATIONS[operation == b"w"] for operation in operations], addresses, [address >> offset_bits for address in addresses]
+			data = b"".join(file.readlines(READ_SIZE))
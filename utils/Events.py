@@ -0,0 +1,130 @@
+import json
+import struct
+
+from utils.Debugger import Debugger
+
+# Structured replacement for the --debug printout: every access, hit, miss,
+# victim, invalidation and dirty-bit change becomes one record with the
+# trace position (counter), cache level, set, tag, event kind and dirty bit.
+#
+# Files ending in .jsonl get one JSON object per line; anything else gets
+# the binary format: 8-byte magic, then 24-byte little-endian records
+# (u64 counter, u8 level, u8 kind, u8 dirty, pad, u32 set, u64 tag).
+MAGIC = b"PCSEVT01"
+RECORD = struct.Struct("<QBBBxIQ")
+
+KINDS = ("read", "write", "hit", "miss", "victim", "invalidate", "dirty")
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Debugger.log messages that are events
+LOGGED_KINDS = {"hit": "hit", "miss": "miss", "set dirty": "dirty"}
+
+# records buffered before they are written out
+BATCH_SIZE = 1 << 14
+
+def is_jsonl(events_file):
+	return events_file.endswith(".jsonl")
+
+# Buffered writer for event records, optionally sampled by a range of set
+# indices [first_set, last_set) and a window of counter values [start, end).
+class EventSink(object):
+	def __init__(self, events_file, counter, sets=None, window=None):
+		self.counter = counter
+		self.sets = sets
+		self.window = window
+		self.jsonl = is_jsonl(events_file)
+		self.file = open(events_file, "w" if self.jsonl else "wb")
+		if not self.jsonl:
+			self.file.write(MAGIC)
+		self.batch = []
+
+	def sampled(self, index):
+		if self.sets and not self.sets[0] <= index < self.sets[1]:
+			return False
+		if self.window and not self.window[0] <= self.counter.get() < self.window[1]:
+			return False
+		return True
+
+	def record(self, level, kind, index, tag, dirty):
+		if not self.sampled(index):
+			return
+		self.batch.append((self.counter.get(), level, KIND_CODES[kind], dirty, index, tag))
+		if len(self.batch) >= BATCH_SIZE:
+			self.flush()
+
+	def flush(self):
+		if self.jsonl:
+			self.file.writelines(json.dumps(event_dict(event)) + "\n" for event in self.batch)
+		else:
+			self.file.write(b"".join(RECORD.pack(*event) for event in self.batch))
+		self.batch.clear()
+
+	def close(self):
+		self.flush()
+		self.file.close()
+
+# Debugger for one cache level that feeds an EventSink; the printed --debug
+# output is still produced when Debugger.debug is set.
+class EventTracer(Debugger):
+	def __init__(self, sink, level, prefix=""):
+		super().__init__(counter=sink.counter, prefix=prefix)
+		self.sink = sink
+		self.level = level
+		# set by the Cache this debugger is attached to
+		self.cache = None
+		# set and tag of the access in progress, for events without a block
+		self.index = 0
+		self.tag = 0
+
+	def enabled(self):
+		return True
+
+	# dirty bit of the block of the access in progress, False if not resident
+	def current_dirty(self):
+		block = self.cache.search(self.index, self.tag) if self.cache else None
+		return bool(block and block.dirty)
+
+	def operation(self, operation, block_address, tag, index):
+		super().operation(operation, block_address, tag, index)
+		self.index = index
+		self.tag = tag
+		self.sink.record(self.level, "read" if operation == "r" else "write", index, tag, self.current_dirty())
+
+	def log(self, *args):
+		super().log(*args)
+		kind = LOGGED_KINDS.get(args[0]) if len(args) == 1 else None
+		if kind:
+			self.sink.record(self.level, kind, self.index, self.tag, self.current_dirty())
+
+	def victim(self, block):
+		super().victim(block)
+		if block is not None:
+			self.sink.record(self.level, "victim", block.index, block.tag, block.dirty)
+
+	def invalidated(self, block, writeDirectlyToMemory=False):
+		super().invalidated(block, writeDirectlyToMemory)
+		if block is not None:
+			self.sink.record(self.level, "invalidate", block.index, block.tag, block.dirty)
+
+def event_dict(event):
+	counter, level, kind, dirty, index, tag = event
+	return {"counter": counter, "level": level, "event": KINDS[kind], "set": index, "tag": tag, "dirty": bool(dirty)}
+
+# yields every event of a file written by EventSink as a dict
+def read_events(events_file):
+	if is_jsonl(events_file):
+		with open(events_file, "r") as file:
+			for line in file:
+				if line.strip():
+					yield json.loads(line)
+		return
+
+	with open(events_file, "rb") as file:
+		if file.read(len(MAGIC)) != MAGIC:
+			raise ValueError(f"{events_file}: not an event file")
+		while True:
+			chunk = file.read(RECORD.size * BATCH_SIZE)
+			if not chunk:
+				return
+			for event in RECORD.iter_unpack(chunk):
+				yield event_dict(event)
@@ -0,0 +1,111 @@
+import bisect
+import itertools
+import random
+import sys
+from array import array
+
+from utils.Trace import DECOMPRESSORS, HEADER, MAGIC
+
+# Deterministic synthetic traces. Every pattern draws from one
+# random.Random(seed), so a seed, pattern and set of options always produce
+# the same accesses. Accesses are produced in chunks of encoded records
+# (`address << 1 | is_write`, as in the binary trace format) and written
+# without a per-access Python call into the file layer.
+PATTERNS = ("sequential", "strided", "random", "zipf", "pointer-chase")
+
+# accesses generated per chunk
+CHUNK_SIZE = 1 << 16
+
+# bytes between consecutive sequential accesses (one word)
+WORD_SIZE = 4
+
+# text trace line of a read and of a write
+LINES = (b"r %x\n", b"w %x\n")
+
+# Each factory returns next_chunk(n), producing the next n addresses as
+# offsets into a footprint of `granules` granules of `stride` bytes.
+def sequential(generator, granules, stride, zipf_s):
+	return strided(generator, granules * stride // WORD_SIZE, WORD_SIZE, zipf_s)
+
+def strided(generator, granules, stride, zipf_s):
+	position = 0
+	def next_chunk(n):
+		nonlocal position
+		chunk = [(position + i) % granules * stride for i in range(n)]
+		position = (position + n) % granules
+		return chunk
+	return next_chunk
+
+# scaling random() is much cheaper than randrange() per access
+def uniform(generator, granules, stride, zipf_s):
+	draw = generator.random
+	return lambda n: [int(draw() * granules) * stride for _ in range(n)]
+
+# Zipfian hot set: granule ranks are drawn with probability proportional to
+# 1 / rank^s and scattered over the footprint by a seeded permutation
+def zipf(generator, granules, stride, zipf_s):
+	cumulative = list(itertools.accumulate(1 / rank ** zipf_s for rank in range(1, granules + 1)))
+	placement = list(range(granules))
+	generator.shuffle(placement)
+	total = cumulative[-1]
+	draw = generator.random
+	def next_chunk(n):
+		return [placement[min(bisect.bisect(cumulative, draw() * total), granules - 1)] * stride for _ in range(n)]
+	return next_chunk
+
+# walks a single random cycle through every granule (Sattolo's algorithm),
+# so each access depends on the previous one like a linked-list traversal
+def pointer_chase(generator, granules, stride, zipf_s):
+	successor = list(range(granules))
+	for i in range(granules - 1, 0, -1):
+		j = generator.randrange(i)
+		successor[i], successor[j] = successor[j], successor[i]
+	node = 0
+	def next_chunk(n):
+		nonlocal node
+		chunk = []
+		for _ in range(n):
+			chunk.append(node * stride)
+			node = successor[node]
+		return chunk
+	return next_chunk
+
+FACTORIES = {"sequential": sequential, "strided": strided, "random": uniform, "zipf": zipf, "pointer-chase": pointer_chase}
+
+# yields array('Q') chunks of `count` encoded records
+def generate(pattern, count, seed=0, footprint=1 << 24, stride=64, write_ratio=0.3, zipf_s=1.0, base=0):
+	if pattern not in FACTORIES:
+		raise ValueError(f"Invalid pattern: {pattern}")
+	granules = footprint // stride
+	if granules <= 0:
+		raise ValueError("the footprint must hold at least one stride")
+
+	generator = random.Random(seed)
+	next_chunk = FACTORIES[pattern](generator, granules, stride, zipf_s)
+	draw = generator.random
+	while count > 0:
+		n = min(count, CHUNK_SIZE)
+		yield array('Q', [(base + address) << 1 | (draw() < write_ratio) for address in next_chunk(n)])
+		count -= n
+
+def open_output(output_file):
+	if output_file == "-":
+		return open(sys.stdout.fileno(), "wb", closefd=False)
+	for extension, compressor in DECOMPRESSORS.items():
+		if output_file.endswith(extension):
+			return compressor(output_file, "wb")
+	return open(output_file, "wb")
+
+# writes `count` records from `generate` as a binary or `r|w <hex address>`
+# text trace; the count is known up front, so any output works, even stdout
+def write_chunks(chunks, count, output_file, binary=False):
+	with open_output(output_file) as file:
+		if binary:
+			file.write(HEADER.pack(MAGIC, count))
+		for records in chunks:
+			if binary:
+				if sys.byteorder != "little":
+					records.byteswap()
+				file.write(records.tobytes())
+			else:
+				file.write(b"".join([LINES[record & 1] % (record >> 1) for record in records]))
@@ -0,0 +1,147 @@
+import json
+import os
+import struct
+
+from cache.Cache import COUNTERS
+from cache.StorageBlock import StorageBlock
+from utils.Trace import LoadedTrace, OPERATIONS, encode, read_trace, trace_digest
+
+# Stream of the requests an L1 cache sends to its lower cache: reads on
+# misses and writes on writebacks, tagged with the trace position that caused
+# them. In a non-inclusive hierarchy L1 never depends on L2, so one recorded
+# stream serves every L2 configuration behind the same L1.
+#
+# <key>.stream: 16-byte header (magic, record count), then per request three
+#   little-endian u64s: trace position, address << 1 | is_write, and the next
+#   use a writeback carries to the lower cache plus one (0 if none)
+# <key>.json: L1 counters and final contents, written last
+MAGIC = b"PCSMIS01"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QQQ")
+
+# file name prefix identifying a trace and the L1 configuration
+def stream_key(trace_file, args):
+	config = f"{args.blocksize}-{args.l1_size}-{args.l1_assoc}-{args.replacement_policy}"
+	if args.replacement_policy == 3 and args.lfu_decay:
+		config += f"-{args.lfu_decay}"
+	return f"{trace_digest(trace_file)[:32]}-{config}"
+
+# Stands in for the lower cache while L1 runs alone; every access is
+# appended to the stream instead of being simulated.
+class StreamRecorder(object):
+	def __init__(self, counter, file):
+		self.counter = counter
+		self.file = file
+		self.buffer = bytearray()
+		self.count = 0
+		self.upper_cache = None
+		# block handed back for the last write, so the policy's writeback
+		# hook can leave metadata on it before the record is written
+		self.pending = None
+
+	def access(self, operation, address, block_number=None):
+		self.flush_pending()
+		position = self.counter.get() - 1
+		if operation == 'w':
+			block = StorageBlock(None)
+			self.pending = (position, address, block)
+			return block
+		self.append(position, operation, address, 0)
+		return None
+
+	def flush_pending(self):
+		if self.pending is None:
+			return
+		position, address, block = self.pending
+		self.pending = None
+		carried = block.metadata.get('next_use', -1) + 1
+		self.append(position, 'w', address, carried)
+
+	def append(self, position, operation, address, carried):
+		self.buffer += RECORD.pack(position, encode(operation, address), carried)
+		self.count += 1
+		if len(self.buffer) >= 1 << 20:
+			self.file.write(self.buffer)
+			self.buffer.clear()
+
+	def close(self):
+		self.flush_pending()
+		self.file.write(self.buffer)
+		self.buffer.clear()
+		self.file.seek(0)
+		self.file.write(HEADER.pack(MAGIC, self.count))
+
+def stream_paths(directory, key):
+	return os.path.join(directory, f"{key}.stream"), os.path.join(directory, f"{key}.json")
+
+def has_stream(directory, key):
+	return os.path.isfile(stream_paths(directory, key)[1])
+
+# runs `l1_cache` over the trace with a recorder as its lower cache
+def record_stream(directory, key, trace, counter, l1_cache):
+	os.makedirs(directory, exist_ok=True)
+	stream_file, state_file = stream_paths(directory, key)
+	lower_cache = l1_cache.lower_cache
+
+	with open(stream_file + ".tmp", "wb") as file:
+		file.write(HEADER.pack(MAGIC, 0))
+		recorder = StreamRecorder(counter, file)
+		l1_cache.lower_cache = recorder
+		try:
+			for operation, address in read_trace(trace):
+				counter.increment()
+				l1_cache.access(operation, address)
+			recorder.close()
+		finally:
+			l1_cache.lower_cache = lower_cache
+
+	state = {
+		"counters": {name: getattr(l1_cache, name) for name in COUNTERS},
+		"contents": [[(block.tag, block.valid, block.dirty) for block in memory_set] for memory_set in l1_cache.memory],
+	}
+	with open(state_file + ".tmp", "w") as file:
+		json.dump(state, file)
+	os.replace(stream_file + ".tmp", stream_file)
+	os.replace(state_file + ".tmp", state_file)
+
+def read_stream(stream_file):
+	with open(stream_file, "rb") as file:
+		magic, count = HEADER.unpack(file.read(HEADER.size))
+		if magic != MAGIC:
+			raise ValueError(f"{stream_file}: not a miss stream")
+		while count > 0:
+			chunk = file.read(min(count, 1 << 16) * RECORD.size)
+			if not chunk:
+				raise ValueError(f"{stream_file}: truncated miss stream")
+			for position, record, carried in RECORD.iter_unpack(chunk):
+				yield position, OPERATIONS[record & 1], record >> 1, carried - 1
+			count -= len(chunk) // RECORD.size
+
+# restores L1 from a recorded stream and replays its requests into L2
+def replay_stream(directory, key, counter, l1_cache, l2_cache):
+	stream_file, state_file = stream_paths(directory, key)
+	with open(state_file, "r") as file:
+		state = json.load(file)
+
+	for name, value in state["counters"].items():
+		setattr(l1_cache, name, value)
+	for memory_set, ways in zip(l1_cache.memory, state["contents"]):
+		for block, (tag, valid, dirty) in zip(memory_set, ways):
+			block.tag = tag
+			block.valid = valid
+			block.dirty = dirty
+
+	upper_block = StorageBlock(None)
+	for position, operation, address, carried in read_stream(stream_file):
+		counter.set(position).increment()
+		lower_block = l2_cache.access(operation, address)
+		if carried >= 0:
+			upper_block.metadata['next_use'] = carried
+			l2_cache.policy.writeback(upper_block, lower_block)
+
+# simulates a non-inclusive hierarchy, recording the L1 stream first if needed
+def simulate_with_stream(directory, trace, args, counter, l1_cache, l2_cache):
+	key = stream_key(trace, args)
+	if not has_stream(directory, key):
+		record_stream(directory, key, trace, counter, l1_cache)
+	replay_stream(directory, key, counter, l1_cache, l2_cache)
@@ -0,0 +1,121 @@
+import mmap
+import os
+import struct
+from array import array
+
+from utils.Trace import STDIN, read_trace
+
+# Next-use sidecar for the optimal policy, written next to the trace as
+# <trace>.<block size>.nextuse: a 32-byte header (magic, record count, block
+# size, reserved) followed by one native-endian i64 per access holding the
+# position of the next access to the same block, or the record count if
+# there is none.
+MAGIC = b"PCSNXT01"
+HEADER = struct.Struct("<8sQQQ")
+ITEM_SIZE = array('q').itemsize
+
+# accesses processed per chunk by the preprocessing passes
+CHUNK_SIZE = 1 << 16
+
+def sidecar_path(trace_file, block_size):
+	return f"{trace_file}.{block_size}.nextuse"
+
+# whether `sidecar_file` holds up-to-date next uses for `trace_file`
+def is_current(sidecar_file, trace_file, block_size):
+	if not os.path.isfile(sidecar_file):
+		return False
+	if os.path.getmtime(sidecar_file) < os.path.getmtime(trace_file):
+		return False
+	with open(sidecar_file, "rb") as file:
+		header = file.read(HEADER.size)
+	if len(header) < HEADER.size:
+		return False
+	magic, count, sidecar_block_size, reserved = HEADER.unpack(header)
+	return magic == MAGIC and sidecar_block_size == block_size
+
+# Two sequential passes with bounded memory: the block number of every access
+# is spilled to a scratch file, which is then scanned backwards chunk by chunk.
+# Only the map from each block to its closest later access stays in memory.
+def write_next_use(trace_file, block_size, sidecar_file):
+	offset_bits = block_size.bit_length() - 1
+	scratch_file = sidecar_file + ".blocks.tmp"
+	count = 0
+	with open(scratch_file, "wb") as file:
+		blocks = array('Q')
+		for operation, address in read_trace(trace_file):
+			blocks.append(address >> offset_bits)
+			if len(blocks) == CHUNK_SIZE:
+				blocks.tofile(file)
+				count += len(blocks)
+				del blocks[:]
+		blocks.tofile(file)
+		count += len(blocks)
+
+	try:
+		with open(scratch_file, "rb") as blocks_file, open(sidecar_file + ".tmp", "wb") as file:
+			file.write(HEADER.pack(MAGIC, count, block_size, 0))
+			file.truncate(HEADER.size + count * ITEM_SIZE)
+			last_seen = {}
+			end = count
+			while end > 0:
+				start = max(end - CHUNK_SIZE, 0)
+				blocks = array('Q')
+				blocks_file.seek(start * blocks.itemsize)
+				blocks.fromfile(blocks_file, end - start)
+
+				next_use = array('q', bytes(ITEM_SIZE * (end - start)))
+				for offset in range(end - start - 1, -1, -1):
+					block = blocks[offset]
+					next_use[offset] = last_seen.get(block, count)
+					last_seen[block] = start + offset
+
+				file.seek(HEADER.size + start * ITEM_SIZE)
+				next_use.tofile(file)
+				end = start
+		os.replace(sidecar_file + ".tmp", sidecar_file)
+	finally:
+		os.remove(scratch_file)
+	return count
+
+# Read-only view of a next-use sidecar, indexable like the in-memory array.
+# Pages are mapped on demand; `slide` drops the pages that fell out of the
+# window behind the current position from the resident set. Older positions
+# stay readable and are paged back in from the file if needed.
+class NextUseWindow(object):
+	def __init__(self, sidecar_file, window=1 << 20):
+		self.file = open(sidecar_file, "rb")
+		self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, count, block_size, reserved = HEADER.unpack_from(self.mapped)
+		self.count = count
+		self.values = memoryview(self.mapped)[HEADER.size:HEADER.size + count * ITEM_SIZE].cast('q')
+		# positions per window, rounded to whole pages
+		self.window = max(window * ITEM_SIZE // mmap.PAGESIZE, 1) * mmap.PAGESIZE // ITEM_SIZE
+		self.window_start = 0
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, position):
+		return self.values[position]
+
+	def slide(self, position):
+		if position < self.window_start + 2 * self.window or not hasattr(self.mapped, "madvise"):
+			return
+		# release whole pages ending one window behind `position`
+		end = (HEADER.size + (position - self.window) * ITEM_SIZE) // mmap.PAGESIZE * mmap.PAGESIZE
+		self.mapped.madvise(mmap.MADV_DONTNEED, 0, end)
+		self.window_start = position - self.window
+
+	def close(self):
+		self.values.release()
+		self.mapped.close()
+		self.file.close()
+
+# opens the sidecar of `trace_file`, writing it first if it is missing or stale
+def open_next_use(trace_file, block_size):
+	if trace_file == STDIN:
+		raise ValueError("the next-use sidecar needs a trace file, not stdin")
+	sidecar_file = sidecar_path(trace_file, block_size)
+	if not is_current(sidecar_file, trace_file, block_size):
+		write_next_use(trace_file, block_size, sidecar_file)
+	return NextUseWindow(sidecar_file)
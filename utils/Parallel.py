@@ -0,0 +1,148 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cache.Cache import COUNTERS
+from sim_cache import create_caches, create_policy
+from utils.Counter import Counter
+from utils.Debugger import Debugger
+from utils.Trace import OPERATIONS, LoadedTrace
+
+# Set-partitioned simulation of a single-level cache. Without an L2 cache no
+# access ever touches more than one set, so disjoint ranges of sets can be
+# simulated in separate processes. Workers reset the Counter to each access's
+# position in the full trace, so every policy sees exactly the timestamps
+# (and the optimal policy the future) of a serial run.
+#
+# The parent sorts the accesses by set range once and shares them, so each
+# worker only iterates its own accesses. The optimal policy's next-use array
+# is computed once in the parent and shared the same way.
+
+def simulate_partitioned(args, trace, l1_cache, jobs, next_use=None):
+	if not isinstance(trace, LoadedTrace):
+		trace = LoadedTrace(trace)
+
+	num_sets = l1_cache.num_sets
+	jobs = min(jobs, num_sets)
+	bounds = [num_sets * job // jobs for job in range(jobs + 1)]
+
+	with Partitions(trace, l1_cache, bounds, next_use) as partitions:
+		jobs_arguments = [(args, bounds[job], bounds[job + 1], partitions.offsets[job], partitions.offsets[job + 1]) for job in range(jobs)]
+		with ProcessPoolExecutor(max_workers=jobs, initializer=attach_partitions, initargs=(partitions.descriptor(),)) as executor:
+			for counters, contents in executor.map(simulate_sets, jobs_arguments):
+				merge(l1_cache, counters, contents)
+
+	return l1_cache
+
+# The accesses of a trace grouped by set range, in a shared memory block:
+#   positions: u64 trace position of every access, range by range and in
+#     trace order within a range; offsets[job] is where range `job` starts
+#   addresses, operations: u64 address and operation byte, in the same order
+#   next_use: the optimal policy's i64 next uses, in trace order, if given
+class Partitions(object):
+	def __init__(self, trace, cache, bounds, next_use=None):
+		count = len(trace)
+		addresses = np.frombuffer(trace.addresses, dtype=np.uint64)
+		sets = (addresses >> np.uint64(cache.offset_bits)) & np.uint64(cache.index_mask)
+		ranges = np.searchsorted(np.array(bounds[1:-1], dtype=np.uint64), sets, side="right")
+		order = np.argsort(ranges, kind="stable")
+		self.offsets = [0] + np.cumsum(np.bincount(ranges, minlength=len(bounds) - 1)).tolist()
+
+		self.count = count
+		self.has_next_use = next_use is not None
+		self.memory = shared_memory.SharedMemory(create=True, size=max((25 if self.has_next_use else 17) * count, 1))
+		views = partition_views(self.memory, count, self.has_next_use)
+		views[0][:] = order
+		views[1][:] = addresses[order]
+		views[2][:] = np.frombuffer(trace.operations, dtype=np.uint8)[order]
+		if self.has_next_use:
+			views[3][:] = np.frombuffer(next_use, dtype=np.int64)
+
+	# picklable description that `attach_partitions` turns back into views
+	def descriptor(self):
+		return self.memory.name, self.count, self.has_next_use
+
+	def close(self):
+		self.memory.close()
+		self.memory.unlink()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+# NumPy views of positions, addresses, operations and next uses (or None)
+def partition_views(memory, count, has_next_use):
+	buffer = memory.buf
+	positions = np.ndarray(count, dtype=np.uint64, buffer=buffer)
+	addresses = np.ndarray(count, dtype=np.uint64, buffer=buffer, offset=8 * count)
+	operations = np.ndarray(count, dtype=np.uint8, buffer=buffer, offset=16 * count)
+	next_use = np.ndarray(count, dtype=np.int64, buffer=buffer, offset=17 * count) if has_next_use else None
+	return positions, addresses, operations, next_use
+
+# Copies a worker's counters and final set contents into the merged cache,
+# along with the block lookup and free way bookkeeping, so searches in it
+# find the resident blocks. The replacement policy state stays with the
+# workers: the merged cache is for reports and lookups, not for simulating
+# further accesses.
+def merge(cache, counters, contents):
+	for name, value in zip(COUNTERS, counters):
+		setattr(cache, name, getattr(cache, name) + value)
+	for index, next_fill, ways in contents:
+		cache.next_fill[index] = next_fill
+		cache.free_ways.pop(index, None)
+		for way, (block, (tag, valid, dirty)) in enumerate(zip(cache.memory[index], ways)):
+			block.tag = tag
+			block.valid = valid
+			block.dirty = dirty
+			if valid:
+				cache.ways[cache.block_number(index, tag)] = way
+			elif way < next_fill:
+				# appended in ascending order, so already a heap
+				cache.free_ways.setdefault(index, []).append(way)
+
+# (shared memory block, memoryviews) used by every partition a worker runs
+worker_partitions = None
+
+def attach_partitions(descriptor):
+	global worker_partitions
+	name, count, has_next_use = descriptor
+	memory = shared_memory.SharedMemory(name=name)
+	buffer = memory.buf
+	views = [buffer[:8 * count].cast("Q"), buffer[8 * count:16 * count].cast("Q"), buffer[16 * count:17 * count]]
+	views.append(buffer[17 * count:25 * count].cast("q") if has_next_use else None)
+	worker_partitions = memory, views
+	atexit.register(detach_partitions)
+
+# the views must be released before the block can be closed
+def detach_partitions():
+	memory, views = worker_partitions
+	for view in views:
+		if view is not None:
+			view.release()
+	memory.close()
+
+# simulates the accesses that map to sets [first_set, last_set), stored at
+# [start, end) of the shared partitions
+def simulate_sets(partition):
+	args, first_set, last_set, start, end = partition
+	memory, (positions, addresses, operations, next_use) = worker_partitions
+	Debugger.debug = False
+
+	counter = Counter()
+	policy, policyName = create_policy(args, counter, args.trace_file, next_use=next_use)
+	l1_cache, l2_cache = create_caches(args, policy)
+
+	access = l1_cache.access
+	for position, operation, address in zip(positions[start:end], operations[start:end], addresses[start:end]):
+		counter.set(position).increment()
+		access(OPERATIONS[operation], address)
+
+	counters = [getattr(l1_cache, name) for name in COUNTERS]
+	contents = []
+	for index in range(first_set, last_set):
+		contents.append((index, l1_cache.next_fill[index], [(block.tag, block.valid, block.dirty) for block in l1_cache.memory[index]]))
+	return counters, contents
@@ -0,0 +1,74 @@
+import cProfile
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# cache methods whose calls are counted and timed per level
+METHODS = ("access", "evict", "flush", "invalidate")
+
+# Wall time and memory allocated per phase of a run, plus call counts of the
+# cache methods of every level. Allocation is measured with tracemalloc and
+# the method counters wrap every call, so profiled runs are several times
+# slower than normal ones; compare phases with each other, not with
+# unprofiled runs. With `profile_output`, cProfile also records the whole
+# run and its stats are dumped there for pstats or snakeviz.
+class Profiler(object):
+	def __init__(self, profile_output=None):
+		# (name, seconds, net allocated bytes, peak allocated bytes)
+		self.phases = []
+		# (level, method) -> [calls, inclusive seconds]
+		self.calls = {}
+		self.profile_output = profile_output
+		self.profile = cProfile.Profile() if profile_output else None
+		tracemalloc.start()
+		if self.profile:
+			self.profile.enable()
+
+	@contextmanager
+	def phase(self, name):
+		tracemalloc.reset_peak()
+		size = tracemalloc.get_traced_memory()[0]
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			seconds = time.perf_counter() - start
+			current, peak = tracemalloc.get_traced_memory()
+			self.phases.append((name, seconds, current - size, peak - size))
+
+	# replaces the counted methods of `cache` by wrappers; must happen before
+	# anything binds them, e.g. run_trace's local `access`
+	def count_calls(self, cache, level):
+		for method in METHODS:
+			setattr(cache, method, self.counted(getattr(cache, method), level, method))
+
+	def counted(self, function, level, method):
+		calls = self.calls[(level, method)] = [0, 0.0]
+		perf_counter = time.perf_counter
+		def wrapper(*args, **kwargs):
+			start = perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				calls[0] += 1
+				calls[1] += perf_counter() - start
+		return wrapper
+
+	def stop(self):
+		if self.profile:
+			self.profile.disable()
+			self.profile.dump_stats(self.profile_output)
+		tracemalloc.stop()
+
+	def report(self, file=sys.stderr):
+		print("===== Profile: phases =====", file=file)
+		print("phase\t\tseconds\t\tallocated (KiB)\tpeak (KiB)", file=file)
+		for name, seconds, allocated, peak in self.phases:
+			print(f"{name:<16}{seconds:<16.6f}{allocated / 1024:<16.1f}{peak / 1024:.1f}", file=file)
+		print("===== Profile: cache calls (time includes nested calls) =====", file=file)
+		print("level\tmethod\t\tcalls\t\tseconds", file=file)
+		for (level, method), (count, seconds) in self.calls.items():
+			print(f"L{level}\t{method:<16}{count:<16}{seconds:.6f}", file=file)
+		if self.profile:
+			print(f"cProfile stats written to {self.profile_output}", file=file)
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from utils.Trace import LoadedTrace, trace_digest
+
+# Results of earlier runs on disk, one JSON file per (trace content,
+# configuration) in a shared directory:
+#   <key>.json: configuration, policy name, print_results counters and,
+#     when the run printed them, the L1/L2 contents
+#   digests/<path hash>.json: trace digest memoized by path, size and mtime,
+#     so unchanged traces are not hashed again
+# Every file is written to a temporary name and renamed into place, so
+# concurrent readers and writers only ever see complete entries. Reads touch
+# an entry's mtime; once the entries exceed max_bytes the least recently used
+# ones are removed.
+class ResultCache(object):
+	def __init__(self, directory, max_bytes=1 << 28):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		os.makedirs(os.path.join(directory, "digests"), exist_ok=True)
+
+	# key of `trace` simulated with `config`, a dict of the sim_cache.py
+	# arguments that determine the results
+	def key(self, trace, config):
+		digest = self.trace_digest(trace)
+		return hashlib.sha256(json.dumps({"trace": digest, "config": config}, sort_keys=True).encode()).hexdigest()
+
+	def trace_digest(self, trace):
+		trace_file = trace.trace_file if isinstance(trace, LoadedTrace) else trace
+		stat = os.stat(trace_file)
+		path_key = hashlib.sha256(os.path.abspath(trace_file).encode()).hexdigest()
+		memo_file = os.path.join(self.directory, "digests", f"{path_key}.json")
+		memo = self.read(memo_file)
+		if memo and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+			return memo["digest"]
+		digest = trace_digest(trace_file)
+		self.write(memo_file, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest})
+		return digest
+
+	def entry_path(self, key):
+		return os.path.join(self.directory, f"{key}.json")
+
+	# the stored entry, or None if there is none or it lacks the contents
+	def get(self, key, contents=False):
+		path = self.entry_path(key)
+		entry = self.read(path)
+		if entry is None or (contents and entry.get("contents") is None):
+			return None
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			# evicted by another process since it was read
+			pass
+		return entry
+
+	def put(self, key, entry):
+		self.write(self.entry_path(key), entry)
+		self.evict()
+
+	# removes least recently used entries until they fit in max_bytes
+	def evict(self):
+		entries = []
+		with os.scandir(self.directory) as scan:
+			for item in scan:
+				if item.name.endswith(".json"):
+					try:
+						stat = item.stat()
+					except FileNotFoundError:
+						continue
+					entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+		total = sum(size for mtime, size, path in entries)
+		for mtime, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			total -= size
+
+	@staticmethod
+	def read(path):
+		try:
+			with open(path, "r") as file:
+				return json.load(file)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return None
+
+	@staticmethod
+	def write(path, value):
+		descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+		try:
+			with os.fdopen(descriptor, "w") as file:
+				json.dump(value, file)
+			os.replace(temporary_path, path)
+		except BaseException:
+			os.remove(temporary_path)
+			raise
@@ -0,0 +1,63 @@
+import atexit
+from multiprocessing import shared_memory
+
+from utils.Trace import LoadedTrace
+
+# A LoadedTrace placed in a shared memory block so worker processes can
+# attach to it without copying or re-reading the trace file. The block holds
+# the u64 addresses followed by one operation byte per access.
+class SharedTrace(object):
+	def __init__(self, trace):
+		count = len(trace)
+		self.trace_file = trace.trace_file
+		self.count = count
+		self.memory = shared_memory.SharedMemory(create=True, size=max(9 * count, 1))
+		self.memory.buf[:8 * count] = memoryview(trace.addresses).cast("B")
+		self.memory.buf[8 * count:9 * count] = trace.operations
+
+	# picklable description that `attach` turns back into a trace
+	def descriptor(self):
+		return self.memory.name, self.trace_file, self.count
+
+	def close(self):
+		self.memory.close()
+		self.memory.unlink()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	# returns the shared memory block (to be kept open while the trace is
+	# used) and a LoadedTrace whose arrays are views into it
+	@staticmethod
+	def attach(descriptor):
+		name, trace_file, count = descriptor
+		memory = shared_memory.SharedMemory(name=name)
+		addresses = memory.buf[:8 * count].cast("Q")
+		operations = memory.buf[8 * count:9 * count]
+		return memory, LoadedTrace(trace_file, operations, addresses)
+
+	# releases the views of an attached trace and closes its memory block
+	@staticmethod
+	def detach(memory, trace):
+		trace.addresses.release()
+		trace.operations.release()
+		memory.close()
+
+# (shared memory block, trace) of a worker process whose pool was created
+# with `initializer=attach_trace, initargs=(shared_trace.descriptor(),)`
+worker_trace = None
+
+def attach_trace(descriptor):
+	global worker_trace
+	worker_trace = SharedTrace.attach(descriptor)
+	atexit.register(detach_trace)
+
+def detach_trace():
+	SharedTrace.detach(*worker_trace)
+
+# the trace attach_trace attached this worker to
+def attached_trace():
+	return worker_trace[1]
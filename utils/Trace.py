@@ -0,0 +1,256 @@
+import bz2
+import gzip
+import hashlib
+import lzma
+import mmap
+import struct
+import sys
+from array import array
+from itertools import islice
+
+# Binary trace format:
+#   header: 8-byte magic followed by the number of records (little-endian u64)
+#   records: one little-endian u64 per access, `address << 1 | is_write`
+# Addresses therefore have to fit in 63 bits.
+MAGIC = b"PCSTRC01"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<Q")
+
+OPERATIONS = ("r", "w")
+OPERATION_NAMES = {b"r": "r", b"w": "w"}
+
+# `-` reads the trace from stdin; these extensions are decompressed on the fly
+STDIN = "-"
+DECOMPRESSORS = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open}
+
+# bytes read from a trace stream at a time
+READ_SIZE = 1 << 20
+
+def is_compressed(trace_file):
+	return any(trace_file.endswith(extension) for extension in DECOMPRESSORS)
+
+# regular, uncompressed files can be memory-mapped and read more than once
+def is_regular_file(trace_file):
+	return trace_file != STDIN and not is_compressed(trace_file)
+
+def is_binary_trace(trace_file):
+	with open(trace_file, "rb") as file:
+		return file.read(len(MAGIC)) == MAGIC
+
+# opens a trace as a buffered binary stream; decompresses .gz/.xz/.bz2 files
+# and leaves stdin open when done
+def open_trace(trace_file):
+	if trace_file == STDIN:
+		return open(sys.stdin.fileno(), "rb", buffering=READ_SIZE, closefd=False)
+	for extension, decompressor in DECOMPRESSORS.items():
+		if trace_file.endswith(extension):
+			return decompressor(trace_file, "rb")
+	return open(trace_file, "rb", buffering=READ_SIZE)
+
+def encode(operation, address):
+	if operation == "r":
+		return address << 1
+	if operation == "w":
+		return address << 1 | 1
+	raise ValueError(f"Invalid operation: {operation}")
+
+# A trace decoded into memory once, e.g. to be simulated repeatedly.
+# Operations are kept as a bytearray (1 for writes), addresses as u64s.
+# Any buffers supporting the same element types may be passed in instead,
+# e.g. memoryviews over shared memory (see utils/SharedTrace.py).
+class LoadedTrace(object):
+	def __init__(self, trace_file, operations=None, addresses=None):
+		self.trace_file = trace_file
+		if addresses is not None:
+			self.operations = operations
+			self.addresses = addresses
+			return
+
+		self.operations = bytearray()
+		self.addresses = array('Q')
+		for operation, address in read_trace(trace_file):
+			self.operations.append(operation == "w")
+			self.addresses.append(address)
+
+	def __len__(self):
+		return len(self.addresses)
+
+	def __iter__(self):
+		operations = OPERATIONS
+		for operation, address in zip(self.operations, self.addresses):
+			yield operations[operation], address
+
+# A trace read once, front to back, over consecutive ranges of accesses, so
+# a stream like stdin can be warmed up on and then simulated without being
+# kept in memory as a LoadedTrace. Each range continues where the previous
+# one stopped and must be read to its end before the next is asked for.
+# With `text`, accesses carry their address text as in read_trace_text.
+class TraceCursor(object):
+	def __init__(self, trace_file, text=False):
+		self.trace_file = trace_file
+		self.text = text
+		self.accesses = read_trace_text(trace_file) if text else read_trace(trace_file)
+		self.position = 0
+
+	# accesses [start, stop) of the trace, without their text unless `text`
+	def read(self, start=0, stop=None, text=False):
+		if start < self.position:
+			raise ValueError(f"{self.trace_file}: cannot go back to access {start} after {self.position}")
+		stop = None if stop is None else max(stop, start)
+		accesses = islice(self.accesses, start - self.position, None if stop is None else stop - self.position)
+		self.position = stop if stop is not None else start
+		if self.text and not text:
+			return ((operation, address) for operation, address, address_text in accesses)
+		return accesses
+
+# yields (operation, address) for every access in a text or binary trace;
+# also accepts a LoadedTrace in place of a file name
+def read_trace(trace_file):
+	if isinstance(trace_file, LoadedTrace):
+		return iter(trace_file)
+	if is_regular_file(trace_file) and is_binary_trace(trace_file):
+		return read_binary_trace(trace_file)
+	return read_trace_stream(trace_file)
+
+# reads any trace front to back in bounded memory, including stdin and
+# compressed files; the format is detected from the first bytes
+def read_trace_stream(trace_file):
+	with open_trace(trace_file) as file:
+		head = read_head(file)
+		if head[:len(MAGIC)] == MAGIC:
+			yield from read_binary_stream(file, trace_file, head)
+		else:
+			yield from read_text_stream(file, head)
+
+# Like read_trace, but yields (operation, address, text) with the address
+# text as written in a text trace, for debug output; for binary and loaded
+# traces it is the address in hex.
+def read_trace_text(trace_file):
+	if isinstance(trace_file, LoadedTrace) or is_regular_file(trace_file) and is_binary_trace(trace_file):
+		for operation, address in read_trace(trace_file):
+			yield operation, address, f"{address:x}"
+		return
+	with open_trace(trace_file) as file:
+		head = read_head(file)
+		if head[:len(MAGIC)] == MAGIC:
+			for operation, address in read_binary_stream(file, trace_file, head):
+				yield operation, address, f"{address:x}"
+		else:
+			yield from read_text_stream(file, head, text=True)
+
+# accesses [start, stop) of a trace or TraceCursor, with their address
+# text as in read_trace_text if `text`
+def read_range(trace_file, start=0, stop=None, text=False):
+	if isinstance(trace_file, TraceCursor):
+		return trace_file.read(start, stop, text)
+	return islice(read_trace_text(trace_file) if text else read_trace(trace_file), start, stop)
+
+# the binary header's worth of bytes from the start of a stream, fewer only
+# at its end; pipes may deliver fewer bytes per read (and peek) than asked for
+def read_head(file):
+	head = b""
+	while len(head) < HEADER.size:
+		chunk = file.read(HEADER.size - len(head))
+		if not chunk:
+			break
+		head += chunk
+	return head
+
+# `head` is the start of the stream, already read from `file`; with `text`,
+# the address text follows every access
+def read_text_stream(file, head=b"", text=False):
+	operation_names = OPERATION_NAMES
+	# complete the line head ends in
+	lines = (head + file.readline()).splitlines()
+	while lines:
+		for line in lines:
+			fields = line.split()
+			# skip empty lines
+			if not fields:
+				continue
+			operation, address = fields
+			operation = operation_names.get(operation) or operation.decode()
+			if text:
+				yield operation, int(address, 16), address.decode()
+			else:
+				yield operation, int(address, 16)
+		lines = file.readlines(READ_SIZE)
+
+# `header` is the binary header, already read from `file`
+def read_binary_stream(file, trace_file, header):
+	operations = OPERATIONS
+	if len(header) < HEADER.size:
+		raise ValueError(f"{trace_file}: truncated binary trace")
+	magic, count = HEADER.unpack(header)
+	while count > 0:
+		chunk = file.read(min(count * RECORD.size, READ_SIZE))
+		if not chunk or len(chunk) % RECORD.size:
+			raise ValueError(f"{trace_file}: truncated binary trace")
+		records = array('Q')
+		records.frombytes(chunk)
+		if sys.byteorder != "little":
+			records.byteswap()
+		for record in records:
+			yield operations[record & 1], record >> 1
+		count -= len(records)
+
+# iterates the records of a binary trace in place through mmap
+def read_binary_trace(trace_file):
+	operations = OPERATIONS
+	with open(trace_file, "rb") as file:
+		with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+			magic, count = HEADER.unpack_from(mapped)
+			end = HEADER.size + count * RECORD.size
+			if len(mapped) < end:
+				raise ValueError(f"{trace_file}: truncated binary trace")
+
+			view = memoryview(mapped)[HEADER.size:end]
+			records = view.cast("Q") if sys.byteorder == "little" else None
+			try:
+				if records is not None:
+					for record in records:
+						yield operations[record & 1], record >> 1
+				else:
+					for record, in RECORD.iter_unpack(view):
+						yield operations[record & 1], record >> 1
+			finally:
+				# exported buffers must be gone before the mapping closes
+				if records is not None:
+					records.release()
+				view.release()
+
+# SHA-256 of a trace file's contents, as a hex string
+def trace_digest(trace_file):
+	if isinstance(trace_file, LoadedTrace):
+		trace_file = trace_file.trace_file
+	digest = hashlib.sha256()
+	with open(trace_file, "rb") as file:
+		for chunk in iter(lambda: file.read(1 << 20), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+# number of accesses in a binary trace, None for text traces
+def count_records(trace_file):
+	with open(trace_file, "rb") as file:
+		magic, count = HEADER.unpack(file.read(HEADER.size).ljust(HEADER.size, b"\0"))
+	return count if magic == MAGIC else None
+
+def write_binary_trace(accesses, output_file):
+	count = 0
+	with open(output_file, "wb") as file:
+		file.write(HEADER.pack(MAGIC, 0))
+		buffer = bytearray()
+		for operation, address in accesses:
+			buffer += RECORD.pack(encode(operation, address))
+			count += 1
+			if len(buffer) >= 1 << 20:
+				file.write(buffer)
+				buffer.clear()
+		file.write(buffer)
+		# patch in the record count now that it is known
+		file.seek(0)
+		file.write(HEADER.pack(MAGIC, count))
+	return count
+
+def convert_trace(trace_file, output_file):
+	return write_binary_trace(read_trace(trace_file), output_file)